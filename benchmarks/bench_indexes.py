@@ -0,0 +1,177 @@
+"""Query plans and latencies of the hot queries with and without secondary indexes.
+
+Seeds a throwaway SQLite catalog, then runs the statements issued by
+`get_products`, `get_product` and `auth.get_user` twice: once with only the
+primary keys, once with the indexes declared in `models.py`.
+
+    python -m benchmarks.bench_indexes --products 2000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+from time import perf_counter
+
+from sqlalchemy import create_engine, func, insert, select, text
+from sqlmodel import SQLModel
+
+from models import Attributes, ProductPricings, Products, Regions, RentalPeriods, User
+
+REGION_CODES = ["SG", "MY", "TH", "VN", "ID", "PH"]
+PERIOD_MONTHS = [3, 6, 12, 24]
+
+
+def seed(engine, products: int, attributes: int, rng: random.Random):
+    regions = [
+        {"id": i + 1, "name": code, "code": code}
+        for i, code in enumerate(REGION_CODES)
+    ]
+    periods = [{"id": i + 1, "month": month} for i, month in enumerate(PERIOD_MONTHS)]
+    with engine.begin() as conn:
+        conn.execute(insert(Regions), regions)
+        conn.execute(insert(RentalPeriods), periods)
+        conn.execute(
+            insert(User),
+            [
+                {
+                    "id": i,
+                    "username": f"user{i}",
+                    "email": f"user{i}@example.com",
+                    "hashed_password": "x",
+                }
+                for i in range(1, 10001)
+            ],
+        )
+        for start in range(1, products + 1, 10000):
+            ids = range(start, min(start + 10000, products + 1))
+            conn.execute(
+                insert(Products),
+                [{"id": i, "name": f"Product {i}", "sku": f"SKU-{i}"} for i in ids],
+            )
+            conn.execute(
+                insert(Attributes),
+                [
+                    {
+                        "name": f"attr{a}",
+                        "value": str(rng.randint(1, 50)),
+                        "product_id": i,
+                    }
+                    for i in ids
+                    for a in range(attributes)
+                ],
+            )
+            conn.execute(
+                insert(ProductPricings),
+                [
+                    {
+                        "product_id": i,
+                        "region_id": region["id"],
+                        "rental_period_id": period["id"],
+                        "price": rng.randint(10, 5000),
+                    }
+                    for i in ids
+                    for region in regions
+                    for period in periods
+                    # Leave some gaps so the availability filter has work to do
+                    if rng.random() < 0.8
+                ],
+            )
+
+
+def hot_queries(products: int, rng: random.Random) -> dict:
+    page_ids = rng.sample(range(1, products + 1), 100)
+    available = (
+        select(ProductPricings.id)
+        .join(Regions, ProductPricings.region_id == Regions.id)
+        .join(RentalPeriods, ProductPricings.rental_period_id == RentalPeriods.id)
+        .where(ProductPricings.product_id == Products.id)
+        .where(Regions.code == "SG", RentalPeriods.month == 12)
+        .exists()
+    )
+    return {
+        "attributes IN (page)": select(Attributes).where(
+            Attributes.product_id.in_(page_ids)
+        ),
+        "pricing IN (page)": (
+            select(ProductPricings, Regions, RentalPeriods)
+            .join(Regions, ProductPricings.region_id == Regions.id)
+            .join(RentalPeriods, ProductPricings.rental_period_id == RentalPeriods.id)
+            .where(ProductPricings.product_id.in_(page_ids))
+        ),
+        "attributes (one product)": select(Attributes).where(
+            Attributes.product_id == page_ids[0]
+        ),
+        "filtered count": select(func.count(Products.id)).where(available),
+        "filtered page": (
+            select(Products).where(available).order_by(Products.id).limit(100)
+        ),
+        "region by code": select(Regions).where(Regions.code == "SG"),
+        "user by username": select(User).where(User.username == "user9000"),
+    }
+
+
+def set_indexes(engine, enabled: bool):
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            for index in table.indexes:
+                if enabled:
+                    index.create(conn, checkfirst=True)
+                else:
+                    index.drop(conn, checkfirst=True)
+        conn.execute(text("ANALYZE"))
+
+
+def measure(engine, queries: dict, repeat: int) -> dict:
+    results = {}
+    with engine.connect() as conn:
+        for label, query in queries.items():
+            compiled = query.compile(engine, compile_kwargs={"literal_binds": True})
+            plan = conn.execute(text(f"EXPLAIN QUERY PLAN {compiled}")).all()
+            timings = []
+            # Unindexed scans can be very slow; stop repeating after ~2s
+            while len(timings) < repeat and (len(timings) < 3 or sum(timings) < 2000):
+                started = perf_counter()
+                conn.execute(query).all()
+                timings.append((perf_counter() - started) * 1000)
+            results[label] = {
+                "plan": "; ".join(row[-1] for row in plan),
+                "median_ms": statistics.median(timings),
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--attributes", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        SQLModel.metadata.create_all(engine)
+        set_indexes(engine, enabled=False)
+        seed(engine, args.products, args.attributes, random.Random(args.seed))
+
+        queries = hot_queries(args.products, random.Random(args.seed))
+        before = measure(engine, queries, args.repeat)
+        set_indexes(engine, enabled=True)
+        after = measure(engine, queries, args.repeat)
+        engine.dispose()
+
+    print(f"{args.products} products, {args.attributes} attributes each\n")
+    print(f"{'query':<26} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+    for label in queries:
+        b, a = before[label]["median_ms"], after[label]["median_ms"]
+        print(f"{label:<26} {b:>10.3f} {a:>10.3f} {b / a if a else 0:>7.1f}x")
+    print()
+    for label in queries:
+        print(label)
+        print(f"  before: {before[label]['plan']}")
+        print(f"  after:  {after[label]['plan']}")
+
+
+if __name__ == "__main__":
+    main()
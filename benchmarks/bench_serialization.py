@@ -0,0 +1,127 @@
+"""Per-page serialization cost of /products/ responses.
+
+Builds a synthetic page of plain product dicts, as returned by
+`endpoints.loaders.build_product_payloads`, and serves it through two
+FastAPI routes, one per serialization path:
+
+- validated: build PaginatedProductResponse and let response_model validate
+  and serialize it again (the default path)
+- fast: return FastJSONResponse with the dicts (FAST_JSON_RESPONSES=true)
+
+Requests go straight to the ASGI app, so no network or database time is
+included.
+
+    python -m benchmarks.bench_serialization --page-size 100
+"""
+import argparse
+import asyncio
+import statistics
+from time import perf_counter
+
+import httpx
+from fastapi import FastAPI
+
+from endpoints.base_models import PaginatedProductResponse
+from endpoints.responses import FastJSONResponse
+
+
+def make_page(page_size: int, attributes: int, prices: int) -> dict:
+    items = [
+        {
+            "id": product_id,
+            "name": f"Product {product_id}",
+            "description": "A reasonably long product description " * 3,
+            "sku": f"SKU-{product_id:06d}",
+            "detail": "Detail text for the product page",
+            "attributes": [
+                {"name": f"Attribute {a}", "value": f"Value {a}"}
+                for a in range(attributes)
+            ],
+            "pricing": [
+                {
+                    "rental_period_months": 3 * (p + 1),
+                    "price": 100 * (p + 1),
+                    "region_name": "Singapore",
+                    "region_code": "SG",
+                }
+                for p in range(prices)
+            ],
+        }
+        for product_id in range(1, page_size + 1)
+    ]
+    return {
+        "current_page": 1,
+        "page_size": page_size,
+        "total_items": 10000,
+        "total_pages": 10000 // page_size,
+        "next_cursor": None,
+        "items": items,
+        "facets": None,
+    }
+
+
+def make_app(payload: dict) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/validated", response_model=PaginatedProductResponse)
+    async def validated():
+        return PaginatedProductResponse(**payload)
+
+    @app.get("/fast", response_model=PaginatedProductResponse)
+    async def fast():
+        return FastJSONResponse(payload)
+
+    return app
+
+
+async def measure(client: httpx.AsyncClient, path: str, repeat: int) -> list:
+    timings = []
+    for _ in range(repeat):
+        started = perf_counter()
+        response = await client.get(path)
+        timings.append((perf_counter() - started) * 1000)
+        response.raise_for_status()
+    return timings
+
+
+async def run(args):
+    payload = make_page(args.page_size, args.attributes, args.prices)
+    app = make_app(payload)
+    transport = httpx.ASGITransport(app=app)
+    client = httpx.AsyncClient(transport=transport, base_url="http://bench")
+    async with client:
+        validated_body = (await client.get("/validated")).json()
+        fast_body = (await client.get("/fast")).json()
+        assert validated_body == fast_body, "serialization paths disagree"
+
+        results = {}
+        for path in ("/validated", "/fast"):
+            await measure(client, path, args.warmup)
+            results[path] = await measure(client, path, args.repeat)
+
+    print(
+        f"page_size={args.page_size}, {args.attributes} attributes, "
+        f"{args.prices} prices per product, {args.repeat} requests\n"
+    )
+    print(f"{'path':<12} {'p50 ms':>8} {'p95 ms':>8}")
+    for path, timings in results.items():
+        p95 = statistics.quantiles(timings, n=20)[-1]
+        print(f"{path:<12} {statistics.median(timings):>8.3f} {p95:>8.3f}")
+    speedup = statistics.median(results["/validated"]) / statistics.median(
+        results["/fast"]
+    )
+    print(f"\nfast path is {speedup:.1f}x faster per page")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--attributes", type=int, default=10)
+    parser.add_argument("--prices", type=int, default=6)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""Concurrent endpoint benchmark with latency and query budgets.
+
+For every catalog size, seeds a throwaway SQLite database with
+generate_data.py and drives the app in-process (no network) with concurrent
+requests to /products/, /products/{id}, /regions, /quotes, /token and
+/users/me/.
+Reports throughput, p50/p95/p99 latency and SQL statements per request, and
+exits non-zero when a route breaks its budget in benchmarks/budgets.json.
+
+    python -m benchmarks.load_test --sizes 1000 20000 --requests 300 --concurrency 20
+
+The response cache is disabled unless --response-cache is passed, so the
+numbers reflect the database path. bcrypt runs at BCRYPT_ROUNDS=4 unless
+the variable is set, so /token measures the app rather than the hash cost.
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from time import perf_counter
+
+BUDGETS_PATH = Path(__file__).with_name("budgets.json")
+QUOTE_LINES = 500
+
+# Statements run by the request currently being driven
+_statements = contextvars.ContextVar("statements", default=None)
+
+
+def percentile(timings: list, pct: float) -> float:
+    ordered = sorted(timings)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def drive(client, name, make_request, requests: int, concurrency: int):
+    """Send `requests` calls with at most `concurrency` in flight."""
+    latencies, statements, failures = [], [], 0
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        nonlocal failures
+        async with slots:
+            counter = []
+            _statements.set(counter)
+            started = perf_counter()
+            response = await make_request(client, i)
+            latencies.append((perf_counter() - started) * 1000)
+            statements.append(len(counter))
+            if response.status_code >= 400:
+                failures += 1
+
+    started = perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = perf_counter() - started
+    return {
+        "route": name,
+        "requests": requests,
+        "failures": failures,
+        "throughput": requests / elapsed,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "queries": statistics.mean(statements),
+        "max_queries": max(statements),
+    }
+
+
+async def run_size(args) -> list:
+    """Benchmark the catalog in the current environment (one process per size)."""
+    import httpx
+    from sqlalchemy import event
+    from sqlmodel.ext.asyncio.session import AsyncSession
+
+    from dimensions import dimension_cache
+    from main import app
+    from pricing_matrix import pricing_matrix
+    from product_documents import rebuild_documents
+    from settings import async_engine
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        counter = _statements.get()
+        if counter is not None:
+            counter.append(statement)
+
+    # Steady state: documents already rendered, dimensions and prices loaded
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        await dimension_cache.refresh(session)
+        await rebuild_documents(session, dimension_cache, batch_size=2000)
+        await pricing_matrix.ensure_current(session)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count_statement)
+    rng = random.Random(args.seed)
+    transport = httpx.ASGITransport(app=app)
+    client = httpx.AsyncClient(transport=transport, base_url="http://bench")
+    async with client:
+        credentials = {"username": "bench", "password": "bench-password"}
+        await client.post(
+            "/register/", json={**credentials, "email": "bench@example.com"}
+        )
+        token = (await client.post("/token", data=credentials)).json()["access_token"]
+        auth = {"Authorization": f"Bearer {token}"}
+        pages = max(1, args.size // 20)
+        # Built up front so the timings do not include generating 500 lines
+        carts = [
+            [
+                {
+                    "product_id": rng.randint(1, args.size),
+                    "region": rng.choice(("SG", "MY")),
+                    "period": rng.choice((3, 6, 12)),
+                    "quantity": rng.randint(1, 5),
+                }
+                for _ in range(QUOTE_LINES)
+            ]
+            for _ in range(10)
+        ]
+
+        scenarios = {
+            "GET /products/": lambda c, i: c.get(
+                "/products/",
+                params={"page": rng.randint(1, pages), "page_size": 20},
+            ),
+            "GET /products/?region": lambda c, i: c.get(
+                "/products/",
+                params={"page": 1, "page_size": 20, "region": "SG", "period": 12},
+            ),
+            "GET /products/?sort=price": lambda c, i: c.get(
+                "/products/",
+                params={
+                    "page_size": 20,
+                    "region": "SG",
+                    "period": 6,
+                    "min_price": rng.randint(0, 2000),
+                    "sort": "price_asc",
+                },
+            ),
+            "GET /products/{id}": lambda c, i: c.get(
+                f"/products/{rng.randint(1, args.size)}"
+            ),
+            "GET /regions": lambda c, i: c.get("/regions"),
+            "POST /quotes": lambda c, i: c.post(
+                "/quotes", json={"lines": carts[i % len(carts)]}
+            ),
+            "POST /token": lambda c, i: c.post("/token", data=credentials),
+            "GET /users/me/": lambda c, i: c.get("/users/me/", headers=auth),
+        }
+        results = []
+        for name, make_request in scenarios.items():
+            results.append(
+                await drive(
+                    client, name, make_request, args.requests, args.concurrency
+                )
+            )
+    await async_engine.dispose()
+    return results
+
+
+def seed_database(path: str, size: int, seed: int):
+    from sqlalchemy import create_engine
+    from sqlmodel import SQLModel
+
+    from generate_data import generate
+
+    engine = create_engine(f"sqlite:///{path}")
+    SQLModel.metadata.create_all(engine)
+    generate(
+        engine,
+        products=size,
+        attributes=10,
+        regions=4,
+        periods=3,
+        seed=seed,
+        batch_size=5000,
+        coverage=0.9,
+    )
+    engine.dispose()
+
+
+def check_budgets(size: int, results: list, budgets: dict) -> list:
+    violations = []
+    for result in results:
+        budget = budgets.get(result["route"], {})
+        if result["failures"]:
+            violations.append(f"{size}: {result['route']} had {result['failures']} errors")
+        for metric in ("p95_ms", "max_queries"):
+            limit = budget.get(metric)
+            if limit is not None and result[metric] > limit:
+                violations.append(
+                    f"{size}: {result['route']} {metric}={result[metric]:.2f} "
+                    f"exceeds budget {limit}"
+                )
+    return violations
+
+
+def print_results(size: int, results: list):
+    print(f"\ncatalog size {size}")
+    print(
+        f"{'route':<26} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+        f"{'queries':>8}"
+    )
+    for r in results:
+        print(
+            f"{r['route']:<26} {r['throughput']:>8.0f} {r['p50_ms']:>8.2f} "
+            f"{r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['queries']:>8.2f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--budgets", default=str(BUDGETS_PATH))
+    parser.add_argument("--response-cache", action="store_true")
+    # Internal: benchmark one already-seeded size and print JSON results
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.size is not None:
+        print(json.dumps(asyncio.run(run_size(args))))
+        return
+
+    budgets = json.loads(Path(args.budgets).read_text())
+    violations = []
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "catalog.db")
+            seed_database(path, size, args.seed)
+            # Settings are read at import time, so each size runs in a fresh process
+            env = {
+                **os.environ,
+                "SQL_URL": "sqlite://",
+                "DB_NAME": path,
+                "SECRET_KEY": os.environ.get("SECRET_KEY", "benchmark-secret-key"),
+                "BCRYPT_ROUNDS": os.environ.get("BCRYPT_ROUNDS", "4"),
+                "DB_ECHO": "false",
+            }
+            if not args.response_cache:
+                env["RESPONSE_CACHE_TTL_SECONDS"] = "0"
+            command = [
+                sys.executable,
+                "-m",
+                "benchmarks.load_test",
+                "--size",
+                str(size),
+                "--requests",
+                str(args.requests),
+                "--concurrency",
+                str(args.concurrency),
+                "--seed",
+                str(args.seed),
+            ]
+            output = subprocess.run(
+                command, env=env, check=True, capture_output=True, text=True
+            ).stdout
+            results = json.loads(output.strip().splitlines()[-1])
+        print_results(size, results)
+        violations += check_budgets(size, results, budgets)
+
+    if violations:
+        print("\nBudget violations:")
+        for violation in violations:
+            print(f"  {violation}")
+        sys.exit(1)
+    print("\nAll routes within budget.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+from typing import Callable, List, Tuple, Type
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# (watched models, callback) pairs registered through watch_commits
+_watchers: List[Tuple[Tuple[Type, ...], Callable[[list], None]]] = []
+
+
+def watch_commits(models: Tuple[Type, ...], callback: Callable[[list], None]):
+    """Call `callback` with the instances of `models` written by each commit.
+
+    Covers every Session in this process, sync or async. Writes made by other
+    processes, or through Core statements that bypass the ORM, are not seen.
+    """
+    _watchers.append((models, callback))
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_written(session, flush_context):
+    written = session.info.setdefault("catalog_written", [])
+    written.extend((*session.new, *session.dirty, *session.deleted))
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_on_commit(session):
+    # Notify only once the write is visible, so a reload can't pick up old rows
+    written = session.info.pop("catalog_written", None)
+    if not written:
+        return
+    for models, callback in _watchers:
+        matched = [obj for obj in written if isinstance(obj, models)]
+        if matched:
+            callback(matched)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_written(session):
+    session.info.pop("catalog_written", None)
@@ -0,0 +1,103 @@
+import asyncio
+from time import monotonic, perf_counter
+from typing import Iterable, Optional, Set
+
+from loguru import logger
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models import Products
+from replicas import on_primary
+from settings import async_engine
+
+
+def written_product_ids(written: list) -> Set[int]:
+    """Ids of the products touched by committed Products/Attributes/pricing rows."""
+    return {
+        obj.id if isinstance(obj, Products) else obj.product_id for obj in written
+    } - {None}
+
+
+class CatalogIndex:
+    """Process-local index derived from the catalog tables.
+
+    Built once (at warm-up, or by the first reader), then kept current
+    incrementally: commits in this process mark products stale through
+    `mark_stale`, and the next reader re-indexes just those. Writes made by
+    other processes are picked up by a background rebuild once the index is
+    older than `max_age_seconds`. Subclasses implement `_build` and `_reindex`.
+    """
+
+    name = "catalog index"
+
+    def __init__(self, max_age_seconds: float):
+        self.max_age_seconds = max_age_seconds
+        self.built_at: Optional[float] = None
+        self.stale: Set[int] = set()
+        self._lock = asyncio.Lock()
+        self._rebuild_task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    async def _build(self, session):
+        """Index the whole catalog into fresh structures, then swap them in."""
+        raise NotImplementedError
+
+    async def _reindex(self, session, product_ids: Set[int]):
+        """Bring `product_ids` up to date, dropping the ones that no longer exist."""
+        raise NotImplementedError
+
+    def mark_stale(self, product_ids: Iterable[int]):
+        self.stale.update(product_ids)
+
+    async def build(self, session):
+        started = perf_counter()
+        # Anything committed from here on is re-indexed after the swap
+        self.stale.clear()
+        await self._build(session)
+        self.built_at = monotonic()
+        logger.debug(
+            f"Built {self.name} over {len(self)} products "
+            f"in {(perf_counter() - started) * 1000:.0f} ms"
+        )
+
+    async def apply_stale(self, session):
+        product_ids, self.stale = self.stale, set()
+        try:
+            await self._reindex(session, product_ids)
+        except Exception:
+            self.stale |= product_ids
+            raise
+
+    async def ensure_current(self, session: Optional[AsyncSession] = None):
+        """Build or re-index on the primary if needed, reusing `session` if it is one.
+
+        Without a session, a connection is only taken when there is work to do.
+        """
+        if self.built_at is None:
+            async with self._lock:
+                if self.built_at is None:
+                    # Indexes follow the primary, never a lagging replica
+                    async with on_primary(session) as primary:
+                        await self.build(primary)
+        elif (
+            monotonic() - self.built_at >= self.max_age_seconds
+            and self._rebuild_task is None
+        ):
+            # Keep answering from the current index while it is rebuilt
+            self._rebuild_task = asyncio.create_task(self._rebuild())
+        if self.stale:
+            async with self._lock:
+                if self.stale:
+                    async with on_primary(session) as primary:
+                        await self.apply_stale(primary)
+
+    async def _rebuild(self):
+        try:
+            async with AsyncSession(async_engine) as session:
+                async with self._lock:
+                    await self.build(session)
+        except Exception as e:
+            logger.error(f"Rebuilding the {self.name} failed: {e}")
+        finally:
+            self._rebuild_task = None
@@ -0,0 +1,305 @@
+"""Memory-mapped catalog snapshots shared by every worker.
+
+`build_snapshot` writes the rendered document of every product (the same
+JSON as `ProductDocuments`), a sorted product id array and, for each region
+and/or rental period filter, the ids of the products priced for it into one
+binary file, then publishes it by atomically replacing the `CURRENT` pointer
+file in CATALOG_SNAPSHOT_DIR. Workers map the published file read-only, so
+the catalog lives once in the OS page cache however many workers run, and
+pick up a new version within CATALOG_SNAPSHOT_CHECK_SECONDS of it being
+published:
+
+    python catalog_snapshot.py --keep 3
+
+Layout: an 8-byte magic, the offset and length of a JSON table of contents
+(u64 each), the concatenated documents, 8-byte aligned little-endian int64
+arrays, then the table of contents. Products changed by commits in this
+process since the snapshot was built are served from the database instead.
+"""
+import argparse
+import asyncio
+import json
+import mmap
+import os
+import struct
+from array import array
+from collections import defaultdict
+from pathlib import Path
+from time import monotonic, perf_counter, time
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import orjson
+from loguru import logger
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from catalog_events import watch_commits
+from catalog_index import written_product_ids
+from dimensions import DimensionCache, dimension_cache
+from endpoints.loaders import PRODUCT_COLUMNS, build_product_payloads
+from models import Attributes, ProductPricings, Products, Regions, RentalPeriods
+from settings import async_engine, settings
+
+MAGIC = b"CATSNAP1"
+HEADER = struct.Struct("<8sQQ")
+POINTER_NAME = "CURRENT"
+BUILD_BATCH_SIZE = 2000
+EMPTY_IDS = np.zeros(0, dtype="<i8")
+
+
+def priced_key(region: Optional[str], period) -> Optional[str]:
+    """Key of the product ids priced for a region and/or period filter."""
+    try:
+        months = int(period) if period else None
+    except (TypeError, ValueError):
+        return None
+    return f"{region or ''}|{months or ''}"
+
+
+# region Builder
+async def build_snapshot(
+    session, dimensions: DimensionCache, directory: Path, keep: int = 3
+) -> Path:
+    """Write a snapshot of the whole catalog into `directory` and publish it."""
+    directory.mkdir(parents=True, exist_ok=True)
+    # Commits from here on may be missing, so they stay stale after the swap
+    built_at = time()
+    version = int(built_at * 1000)
+    path = directory / f"catalog-{version}.snapshot"
+    partial = path.with_suffix(".partial")
+
+    ids = array("q")
+    offsets = array("q")
+    priced = defaultdict(lambda: array("q"))
+    with open(partial, "wb") as file:
+        file.write(HEADER.pack(MAGIC, 0, 0))
+        position = HEADER.size
+        last_id = 0
+        while True:
+            products = (
+                await session.exec(
+                    select(*PRODUCT_COLUMNS)
+                    .where(Products.id > last_id)
+                    .order_by(Products.id)
+                    .limit(BUILD_BATCH_SIZE)
+                )
+            ).all()
+            if not products:
+                break
+            for payload in await build_product_payloads(session, dimensions, products):
+                body = orjson.dumps(payload)
+                ids.append(payload["id"])
+                offsets.append(position)
+                file.write(body)
+                position += len(body)
+                keys = set()
+                for price in payload["pricing"]:
+                    region = price["region_code"]
+                    months = price["rental_period_months"]
+                    keys.update((f"{region}|{months}", f"{region}|", f"|{months}"))
+                for key in keys:
+                    priced[key].append(payload["id"])
+            last_id = products[-1].id
+        offsets.append(position)
+
+        def write_array(values: array) -> list:
+            nonlocal position
+            padding = -position % 8
+            file.write(b"\0" * padding)
+            position += padding
+            start = position
+            file.write(np.frombuffer(values, dtype=np.int64).astype("<i8").tobytes())
+            position += len(values) * 8
+            return [start, len(values)]
+
+        toc = {
+            "version": version,
+            "built_at": built_at,
+            "ids": write_array(ids),
+            "offsets": write_array(offsets),
+            "priced": {key: write_array(values) for key, values in priced.items()},
+        }
+        toc_bytes = json.dumps(toc).encode("utf-8")
+        file.write(toc_bytes)
+        file.seek(0)
+        file.write(HEADER.pack(MAGIC, position, len(toc_bytes)))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(partial, path)
+    publish(directory, path.name)
+    prune(directory, keep)
+    return path
+
+
+def publish(directory: Path, name: str):
+    """Point `CURRENT` at snapshot `name`; readers see the old or the new one."""
+    pointer = directory / POINTER_NAME
+    partial = pointer.with_suffix(".partial")
+    partial.write_text(name)
+    os.replace(partial, pointer)
+
+
+def prune(directory: Path, keep: int):
+    # Workers still mapping an unlinked file keep reading it until they swap
+    snapshots = sorted(directory.glob("catalog-*.snapshot"))
+    for old in snapshots[: max(len(snapshots) - keep, 0)]:
+        old.unlink(missing_ok=True)
+
+
+# region Reader
+class CatalogSnapshot:
+    """One published snapshot, mapped read-only."""
+
+    def __init__(self, path: Path):
+        with open(path, "rb") as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, toc_offset, toc_length = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a catalog snapshot")
+        toc = json.loads(self.buffer[toc_offset : toc_offset + toc_length])
+        self.path = path
+        self.version = toc["version"]
+        self.built_at = toc["built_at"]
+        # Views over the mapping; nothing is copied into this process
+        self.ids = self._array(toc["ids"])
+        self.offsets = self._array(toc["offsets"])
+        self.priced = {
+            key: self._array(location) for key, location in toc["priced"].items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _array(self, location) -> np.ndarray:
+        offset, count = location
+        return np.frombuffer(self.buffer, dtype="<i8", count=count, offset=offset)
+
+    def document(self, product_id: int) -> Optional[bytes]:
+        position = int(np.searchsorted(self.ids, product_id))
+        if position == len(self.ids) or self.ids[position] != product_id:
+            return None
+        return self.buffer[self.offsets[position] : self.offsets[position + 1]]
+
+    def product_ids(self, region: Optional[str], period) -> np.ndarray:
+        """Ids of the products priced for the filters, in id order."""
+        if not region and not period:
+            return self.ids
+        key = priced_key(region, period)
+        return self.priced.get(key, EMPTY_IDS) if key else EMPTY_IDS
+
+
+class SnapshotStore:
+    """The snapshot currently published in a directory, swapped in when it changes."""
+
+    def __init__(self, directory: str, check_seconds: float):
+        self.directory = Path(directory) if directory else None
+        self.check_seconds = check_seconds
+        self.snapshot: Optional[CatalogSnapshot] = None
+        self._pointer_state = None
+        self._checked_at: Optional[float] = None
+        # Product id -> time of the last local commit touching it
+        self.changed: Dict[int, float] = {}
+        self.dimensions_changed_at: Optional[float] = None
+
+    def current(self) -> Optional[CatalogSnapshot]:
+        if self.directory is None:
+            return None
+        now = monotonic()
+        if self._checked_at is None or now - self._checked_at >= self.check_seconds:
+            self._checked_at = now
+            self._check_pointer()
+        snapshot = self.snapshot
+        if snapshot is None or (
+            self.dimensions_changed_at is not None
+            and self.dimensions_changed_at >= snapshot.built_at
+        ):
+            return None
+        return snapshot
+
+    def _check_pointer(self):
+        pointer = self.directory / POINTER_NAME
+        try:
+            stat = pointer.stat()
+            state = (stat.st_ino, stat.st_mtime_ns)
+            if state == self._pointer_state:
+                return
+            snapshot = CatalogSnapshot(self.directory / pointer.read_text().strip())
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.error(f"Loading the catalog snapshot failed: {e}")
+            return
+        self._pointer_state = state
+        self.swap(snapshot)
+
+    def swap(self, snapshot: CatalogSnapshot):
+        # Readers holding the previous snapshot finish with it; it is unmapped
+        # once nothing references it
+        self.snapshot = snapshot
+        self.changed = {
+            product_id: changed_at
+            for product_id, changed_at in self.changed.items()
+            if changed_at >= snapshot.built_at
+        }
+        logger.info(
+            f"Serving catalog snapshot {snapshot.version} "
+            f"({len(snapshot)} products) from {snapshot.path}"
+        )
+
+    def is_current(
+        self, snapshot: CatalogSnapshot, product_ids: Optional[Iterable[int]] = None
+    ) -> bool:
+        """Whether no product (or none of `product_ids`) changed since it was built."""
+        changed = self.changed
+        if product_ids is None:
+            product_ids = changed
+        built_at = snapshot.built_at
+        return not any(changed.get(pid, 0) >= built_at for pid in product_ids)
+
+    def mark_changed(self, product_ids: Iterable[int]):
+        now = time()
+        for product_id in product_ids:
+            self.changed[product_id] = now
+
+    def mark_dimensions_changed(self):
+        self.dimensions_changed_at = time()
+
+
+catalog_snapshot = SnapshotStore(
+    settings.CATALOG_SNAPSHOT_DIR, settings.CATALOG_SNAPSHOT_CHECK_SECONDS
+)
+watch_commits(
+    (Products, Attributes, ProductPricings),
+    lambda written: catalog_snapshot.mark_changed(written_product_ids(written)),
+)
+watch_commits(
+    (Regions, RentalPeriods), lambda written: catalog_snapshot.mark_dimensions_changed()
+)
+
+
+# region CLI
+async def _build(directory: Path, keep: int):
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        await dimension_cache.refresh(session)
+        started = perf_counter()
+        path = await build_snapshot(session, dimension_cache, directory, keep=keep)
+        elapsed = perf_counter() - started
+    await async_engine.dispose()
+    logger.info(
+        f"Published {path} ({path.stat().st_size / 2**20:.1f} MiB) in {elapsed:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--dir",
+        default=settings.CATALOG_SNAPSHOT_DIR or "snapshots",
+        help="Snapshot directory (default: CATALOG_SNAPSHOT_DIR)",
+    )
+    parser.add_argument(
+        "--keep", type=int, default=3, help="Snapshot files to keep, newest first"
+    )
+    args = parser.parse_args()
+    asyncio.run(_build(Path(args.dir), args.keep))
@@ -362,4 +362,22 @@ def create_test_data(session: Session):
         session.commit()
 
     print("Created 18 products with attributes and pricing")
-    return True
\ No newline at end of file
+    return True
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from sqlmodel import SQLModel
+
+    from settings import engine
+
+    parser = argparse.ArgumentParser(description="Seed the sample catalog.")
+    parser.add_argument(
+        "--create-tables", action="store_true", help="Create missing tables first"
+    )
+    args = parser.parse_args()
+    if args.create_tables:
+        SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        create_test_data(session=session)
@@ -0,0 +1,99 @@
+import asyncio
+from time import monotonic
+from typing import Annotated, Dict, List, Optional
+
+from fastapi import Depends, Request
+from loguru import logger
+from sqlmodel import select
+
+from catalog_events import watch_commits
+from models import Regions, RentalPeriods
+from replicas import open_read_session
+from settings import settings
+
+
+class DimensionCache:
+    """Process-local copy of the Regions and RentalPeriods tables.
+
+    Both tables change rarely, so pricing rows are resolved against this
+    cache instead of joining them on every request. The cache reloads when
+    its version is bumped (any flush touching either table in this process)
+    or when the TTL runs out, which covers writes made by other processes.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self.version = 0
+        self._loaded_version: Optional[int] = None
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+        self.regions: Dict[int, Regions] = {}
+        self.region_ids_by_code: Dict[str, int] = {}
+        self.period_months: Dict[int, int] = {}
+        self.period_ids_by_month: Dict[int, int] = {}
+
+    @property
+    def is_fresh(self) -> bool:
+        return (
+            self._loaded_version == self.version
+            and monotonic() - self._loaded_at < self.ttl_seconds
+        )
+
+    def invalidate(self):
+        """Bump the version so the next access reloads both tables."""
+        self.version += 1
+
+    async def ensure_loaded(self, session):
+        if self.is_fresh:
+            return
+        async with self._lock:
+            if not self.is_fresh:
+                await self.refresh(session)
+
+    async def refresh(self, session):
+        version = self.version
+        regions = (await session.exec(select(Regions).order_by(Regions.id))).all()
+        periods = (
+            await session.exec(select(RentalPeriods).order_by(RentalPeriods.id))
+        ).all()
+
+        # Swap whole dicts so concurrent readers never see a half-built cache
+        self.regions = {
+            region.id: Regions(id=region.id, name=region.name, code=region.code)
+            for region in regions
+        }
+        self.region_ids_by_code = {region.code: region.id for region in regions}
+        self.period_months = {period.id: period.month for period in periods}
+        self.period_ids_by_month = {period.month: period.id for period in periods}
+        self._loaded_version = version
+        self._loaded_at = monotonic()
+        logger.debug(f"Loaded {len(regions)} regions and {len(periods)} rental periods")
+
+    def region_list(self) -> List[Regions]:
+        return list(self.regions.values())
+
+    def region_id(self, code: str) -> Optional[int]:
+        return self.region_ids_by_code.get(code)
+
+    def period_id(self, months) -> Optional[int]:
+        try:
+            return self.period_ids_by_month.get(int(months))
+        except (TypeError, ValueError):
+            return None
+
+
+dimension_cache = DimensionCache(ttl_seconds=settings.DIMENSION_CACHE_TTL_SECONDS)
+
+
+watch_commits((Regions, RentalPeriods), lambda written: dimension_cache.invalidate())
+
+
+async def get_dimensions(request: Request) -> DimensionCache:
+    # Only a reload takes a connection; a fresh cache is returned as is
+    if not dimension_cache.is_fresh:
+        async with await open_read_session(request) as session:
+            await dimension_cache.ensure_loaded(session)
+    return dimension_cache
+
+
+DimensionsDep = Annotated[DimensionCache, Depends(get_dimensions)]
@@ -1,7 +1,11 @@
 from fastapi import APIRouter
 from .products import product_router
 from .auth import auth_router
+from .monitoring import monitoring_router
+from .quotes import quote_router
 
 api_router = APIRouter()
 api_router.include_router(product_router)
 api_router.include_router(auth_router)
+api_router.include_router(monitoring_router)
+api_router.include_router(quote_router)
@@ -1,32 +1,67 @@
 from datetime import datetime, timedelta, timezone
-from typing import Annotated
+from typing import Annotated, Dict
 
 import jwt
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jwt.exceptions import InvalidTokenError
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import select
 
+from catalog_events import watch_commits
 from models import *
 from endpoints.base_models import *
-from settings import SessionDep, settings
+from passwords import hash_password, needs_rehash, verify_password
+from replicas import open_read_session
+from settings import open_session, settings
+from ttl_cache import TTLCache
 
 auth_router = APIRouter(tags=["Auth"])
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Verified bearer tokens -> (detached user, user version when cached)
+verified_tokens = TTLCache(
+    max_entries=settings.TOKEN_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.TOKEN_CACHE_TTL_SECONDS,
+)
+# Bumped on every committed change to a user, retiring their cached tokens
+user_versions: Dict[int, int] = {}
+user_changes = {"total": 0}
 
-def get_user(session, username: str):
-    user = session.exec(select(User).where(User.username == username)).one_or_none()
+
+def invalidate_users(users: list):
+    for user in users:
+        user_versions[user.id] = user_versions.get(user.id, 0) + 1
+    user_changes["total"] += 1
+
+
+watch_commits((User,), invalidate_users)
+
+
+async def get_user(session, username: str):
+    user = (
+        await session.exec(select(User).where(User.username == username))
+    ).one_or_none()
     return user
 
 
-def authenticate_user(session, username: str, password: str):
-    user = get_user(session, username)
+async def authenticate_user(username: str, password: str):
+    # Sessions are closed before hashing, so requests waiting on a hash slot
+    # or running bcrypt never hold a pooled connection
+    async with await open_session() as session:
+        user = await get_user(session, username)
     if not user:
         return False
-    if not user.verify_password(password):
+    if not await verify_password(password, user.hashed_password):
         return False
+    if needs_rehash(user.hashed_password):
+        # The work factor changed since this hash was made; upgrade it in place
+        hashed_password = await hash_password(password)
+        async with await open_session() as session:
+            session.add(user)
+            user.hashed_password = hashed_password
+            await session.commit()
     return user
 
 
@@ -42,20 +77,32 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
 
 
 @auth_router.post("/register/")
-def register(userModel: UserModel, session: SessionDep) -> User:
-    user = User(username=userModel.username, email=userModel.email)
-    user.set_password(userModel.password)  # Set the password
-    session.add(user)
-    session.commit()
-    session.refresh(user)
+async def register(userModel: UserModel) -> User:
+    user = User(
+        username=userModel.username,
+        email=userModel.email,
+        hashed_password=await hash_password(userModel.password),
+    )
+    async with await open_session() as session:
+        session.add(user)
+        try:
+            await session.commit()
+        except IntegrityError:
+            # ix_user_username is unique
+            await session.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Username already registered",
+            )
+        await session.refresh(user)
     return {"username": user.username, "email": user.email}
 
 
 @auth_router.post("/token")
 async def login_for_access_token(
-    form_data: Annotated[OAuth2PasswordRequestForm, Depends()], session: SessionDep
+    form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
 ) -> Token:
-    user = authenticate_user(session, form_data.username, form_data.password)
+    user = await authenticate_user(form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -70,8 +117,15 @@ async def login_for_access_token(
 
 
 async def get_current_user(
-    token: Annotated[str, Depends(oauth2_scheme)], session: SessionDep
+    request: Request, token: Annotated[str, Depends(oauth2_scheme)]
 ):
+    # A token seen before was already verified; skip the signature check and query
+    cached = verified_tokens.get(token)
+    if cached is not None:
+        user, user_version = cached
+        if user_versions.get(user.id, 0) == user_version:
+            return user
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -85,9 +139,21 @@ async def get_current_user(
         token_data = TokenData(username=username)
     except InvalidTokenError:
         raise credentials_exception
-    user = get_user(session, username=token_data.username)
+
+    # Only opened on a cache miss, so cached requests never touch the pool
+    changes_before_read = user_changes["total"]
+    async with await open_read_session(request) as session:
+        user = await get_user(session, username=token_data.username)
     if user is None:
         raise credentials_exception
+
+    user = User(**user.model_dump())
+    # Skip caching if any user changed while we were reading this one
+    if user_changes["total"] == changes_before_read:
+        # Never keep a token past its own expiry
+        expires_in = payload["exp"] - datetime.now(timezone.utc).timestamp()
+        user_version = user_versions.get(user.id, 0)
+        verified_tokens.set(token, (user, user_version), ttl_seconds=expires_in)
     return user
 
 
@@ -1,6 +1,10 @@
 # Add these imports at the top of main.py
 from typing import List, Optional
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
+
+
+# Largest id the BIGINT/int64 product id columns and arrays can hold
+MAX_PRODUCT_ID = 2**63 - 1
 
 
 # Add these Pydantic models for the API response
@@ -26,14 +30,79 @@ class ProductResponse(BaseModel):
     pricing: List[PricingResponse]
 
 
+class SparseProductResponse(BaseModel):
+    """A ProductResponse as trimmed by `fields`/`include`; only `id` is always sent."""
+
+    id: int
+    name: str = None
+    description: Optional[str] = None
+    sku: Optional[str] = None
+    detail: Optional[str] = None
+    attributes: List[AttributeResponse] = None
+    pricing: List[PricingResponse] = None
+
+
+class FacetValueResponse(BaseModel):
+    value: str
+    count: int
+
+
+class FacetResponse(BaseModel):
+    name: str
+    values: List[FacetValueResponse]
+
+
 class PaginatedProductResponse(BaseModel):
     items: List[ProductResponse]
+    current_page: Optional[int] = None
+    page_size: int
+    total_items: Optional[int] = None
+    total_pages: Optional[int] = None
+    next_cursor: Optional[str] = None
+    facets: Optional[List[FacetResponse]] = None
+
+
+class PaginatedSparseProductResponse(PaginatedProductResponse):
+    items: List[SparseProductResponse]
+
+
+class BatchProductResponse(BaseModel):
+    items: List[ProductResponse]
+    not_found: List[int]
+
+
+class SearchProductResponse(BaseModel):
+    items: List[ProductResponse]
+    query: str
     current_page: int
     page_size: int
     total_items: int
     total_pages: int
 
 
+class QuoteLine(BaseModel):
+    product_id: int = Field(ge=1, le=MAX_PRODUCT_ID)
+    region: str = Field(description="Region code (eg: SG, MY)")
+    period: int = Field(description="Rental period in months (eg: 3, 6, 12)")
+    # Keeps line totals and the grand total of a full cart within int64
+    quantity: int = Field(default=1, ge=1, le=1_000_000)
+
+
+class QuoteRequest(BaseModel):
+    lines: List[QuoteLine] = Field(min_length=1)
+
+
+class QuoteLineResponse(QuoteLine):
+    unit_price: Optional[int]
+    line_total: Optional[int]
+
+
+class QuoteResponse(BaseModel):
+    lines: List[QuoteLineResponse]
+    total: int
+    unavailable: List[int]
+
+
 class ResgionResponse(BaseModel):
     id: int
     name: str
@@ -63,4 +132,22 @@ class UserInDB(UserResponse):
 class UserModel(BaseModel):
     username: str
     password: str
-    email: EmailStr    
\ No newline at end of file
+    email: EmailStr
+
+
+class PoolStatsResponse(BaseModel):
+    pool_size: int
+    checked_out: int
+    idle: int
+    overflow: int
+    max_overflow: int
+    acquisitions: int
+    timeouts: int
+    avg_wait_ms: float
+    max_wait_ms: float
+
+
+class ReadinessResponse(BaseModel):
+    status: str
+    error: Optional[str] = None
+    warmup_ms: Optional[float] = None
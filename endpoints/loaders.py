@@ -0,0 +1,213 @@
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence
+
+import sqlalchemy
+from sqlalchemy import false
+from sqlmodel import select
+
+from dimensions import DimensionCache
+from models import Attributes, ProductPricings, Products
+
+
+# region Filters
+def pricing_conditions(
+    dimensions: DimensionCache,
+    region: Optional[str] = None,
+    period: Optional[str] = None,
+) -> Optional[list]:
+    """WHERE conditions on ProductPricings for the `region`/`period` filters.
+
+    Region codes and months are resolved to ids from the dimension cache, so
+    no join is needed. Returns None when a filter names an unknown region or
+    period, i.e. when no pricing row can match.
+    """
+    conditions = []
+    if region:
+        region_id = dimensions.region_id(region)
+        if region_id is None:
+            return None
+        conditions.append(ProductPricings.region_id == region_id)
+    if period:
+        period_id = dimensions.period_id(period)
+        if period_id is None:
+            return None
+        conditions.append(ProductPricings.rental_period_id == period_id)
+    return conditions
+
+
+def pricing_filter(
+    dimensions: DimensionCache,
+    region: Optional[str] = None,
+    period: Optional[str] = None,
+):
+    """EXISTS clause keeping only products with a pricing row for `region`/`period`.
+
+    Returns None when neither filter is set.
+    """
+    if not region and not period:
+        return None
+
+    conditions = pricing_conditions(dimensions, region, period)
+    if conditions is None:
+        return false()
+    return (
+        select(ProductPricings.id)
+        .where(ProductPricings.product_id == Products.id, *conditions)
+        .exists()
+    )
+
+
+def attribute_conditions(product_id_column, filters: Dict[str, List[str]]) -> list:
+    """EXISTS clauses requiring each `filters` name to have one of its values.
+
+    Correlated on `product_id_column`, so each is an indexed probe per product.
+    """
+    return [
+        select(Attributes.id)
+        .where(
+            Attributes.product_id == product_id_column,
+            Attributes.name == name,
+            Attributes.value.in_(values),
+        )
+        .exists()
+        for name, values in filters.items()
+    ]
+
+
+# region Loaders
+# Columns of ProductResponse, selected as plain rows rather than ORM entities
+PRODUCT_COLUMNS = (
+    Products.id,
+    Products.name,
+    Products.description,
+    Products.sku,
+    Products.detail,
+)
+PRODUCT_FIELDS = tuple(column.key for column in PRODUCT_COLUMNS)
+# Relations a product response can include, in response order
+PRODUCT_RELATIONS = ("attributes", "pricing")
+
+
+def select_product_rows(columns: Sequence = PRODUCT_COLUMNS):
+    """SELECT of product columns returning rows (with `.id`) even for `id` alone.
+
+    sqlmodel's select() would return bare values for a single column.
+    """
+    return sqlalchemy.select(*columns)
+
+
+def product_columns(fields: Optional[Sequence[str]] = None) -> tuple:
+    """PRODUCT_COLUMNS narrowed to `fields` (all when None); `id` is always kept."""
+    if fields is None:
+        return PRODUCT_COLUMNS
+    return tuple(
+        column
+        for column in PRODUCT_COLUMNS
+        if column.key == "id" or column.key in fields
+    )
+
+
+async def load_attributes(
+    session, product_ids: Sequence[int]
+) -> Dict[int, List[dict]]:
+    """Fetch the attributes of many products in one query, grouped by product id.
+
+    Each attribute is a plain dict shaped like AttributeResponse.
+    """
+    attributes_by_product = defaultdict(list)
+    if not product_ids:
+        return attributes_by_product
+
+    attribute_rows = (
+        await session.exec(
+            select(Attributes.product_id, Attributes.name, Attributes.value)
+            .where(Attributes.product_id.in_(product_ids))
+            .order_by(Attributes.id)
+        )
+    ).all()
+    for product_id, name, value in attribute_rows:
+        attributes_by_product[product_id].append({"name": name, "value": value})
+    return attributes_by_product
+
+
+async def load_pricing(
+    session,
+    dimensions: DimensionCache,
+    product_ids: Sequence[int],
+    region: Optional[str] = None,
+    period: Optional[str] = None,
+) -> Dict[int, List[dict]]:
+    """Fetch the pricing of many products in one query, grouped by product id.
+
+    `region` and `period` narrow the rows the same way the product endpoints do.
+    Region and rental period details come from the dimension cache. Each price
+    is a plain dict shaped like PricingResponse.
+    """
+    pricing_by_product = defaultdict(list)
+    conditions = pricing_conditions(dimensions, region, period)
+    if not product_ids or conditions is None:
+        return pricing_by_product
+
+    pricing_rows = (
+        await session.exec(
+            select(
+                ProductPricings.product_id,
+                ProductPricings.region_id,
+                ProductPricings.rental_period_id,
+                ProductPricings.price,
+            )
+            .where(ProductPricings.product_id.in_(product_ids), *conditions)
+            .order_by(ProductPricings.id)
+        )
+    ).all()
+    for product_id, region_id, rental_period_id, price in pricing_rows:
+        region_row = dimensions.regions.get(region_id)
+        months = dimensions.period_months.get(rental_period_id)
+        if region_row is None or months is None:
+            # Added after the cache was loaded; reload it on the next access
+            dimensions.invalidate()
+            continue
+        pricing_by_product[product_id].append(
+            {
+                "rental_period_months": months,
+                "price": price,
+                "region_name": region_row.name,
+                "region_code": region_row.code,
+            }
+        )
+    return pricing_by_product
+
+
+async def build_product_payloads(
+    session,
+    dimensions: DimensionCache,
+    products: Sequence,
+    region: Optional[str] = None,
+    period: Optional[str] = None,
+    fields: Optional[Sequence[str]] = None,
+    include: Optional[Sequence[str]] = None,
+) -> List[dict]:
+    """Attach attributes and pricing to a page of products.
+
+    `products` may be Products entities or PRODUCT_COLUMNS rows. Returns plain
+    dicts shaped like ProductResponse, ready to validate or to serialize as is.
+    Runs a fixed number of queries regardless of how many products are passed.
+
+    `fields` and `include` narrow the payloads to those columns and relations
+    (all of them when None); relations left out are never queried.
+    """
+    keys = [column.key for column in product_columns(fields)]
+    payloads = [{key: getattr(product, key) for key in keys} for product in products]
+    include = PRODUCT_RELATIONS if include is None else include
+    product_ids = [product.id for product in products]
+    if "attributes" in include:
+        attributes_by_product = await load_attributes(session, product_ids)
+        for payload in payloads:
+            payload["attributes"] = attributes_by_product[payload["id"]]
+    if "pricing" in include:
+        pricing_by_product = await load_pricing(
+            session, dimensions, product_ids, region, period
+        )
+        for payload in payloads:
+            payload["pricing"] = pricing_by_product[payload["id"]]
+    return payloads
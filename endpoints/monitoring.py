@@ -0,0 +1,36 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from endpoints.base_models import PoolStatsResponse, ReadinessResponse
+from request_metrics import render_metrics
+from settings import async_engine, pool_stats
+from warmup import readiness
+
+monitoring_router = APIRouter(tags=["Monitoring"])
+
+
+# region API
+@monitoring_router.get("/pool-stats", response_model=PoolStatsResponse)
+async def get_pool_stats():
+    """Live connection pool usage, to tell pool exhaustion from a slow database."""
+    return pool_stats.snapshot(async_engine.pool)
+
+
+@monitoring_router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Per-route latency, DB time and statement histograms in Prometheus format."""
+    return PlainTextResponse(
+        render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@monitoring_router.get(
+    "/ready",
+    response_model=ReadinessResponse,
+    responses={503: {"model": ReadinessResponse}},
+)
+async def get_readiness():
+    """200 once startup warm-up has finished, 503 while it is still running."""
+    return JSONResponse(
+        status_code=200 if readiness.ready else 503, content=readiness.snapshot()
+    )
@@ -1,173 +1,712 @@
+import base64
+import json
+from collections import defaultdict
 from math import ceil
+from typing import Dict, Literal, Sequence, Tuple
 
-from fastapi import APIRouter, Query, status
-from fastapi.responses import JSONResponse
+import numpy as np
+import orjson
+from fastapi import APIRouter, HTTPException, Query, Request, status
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from loguru import logger
-from sqlalchemy import func
+from sqlalchemy import and_, false, func, or_
 from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
+from catalog_snapshot import CatalogSnapshot, catalog_snapshot
+from dimensions import DimensionsDep, dimension_cache
 from endpoints.base_models import *
+from endpoints.loaders import (
+    PRODUCT_COLUMNS,
+    PRODUCT_FIELDS,
+    PRODUCT_RELATIONS,
+    attribute_conditions,
+    build_product_payloads,
+    pricing_conditions,
+    pricing_filter,
+    product_columns,
+    select_product_rows,
+)
+from endpoints.responses import FastJSONResponse
+from facet_index import bitmap_of, facet_index, ids_after, nth_set_bit
 from models import *
-from settings import SessionDep
+from product_documents import get_product_document, get_product_documents
+from search_index import search_index
+from replicas import ReadSessionDep, open_read_session
+from settings import settings
 
 product_router = APIRouter(tags=["Product"])
 
+ATTRIBUTE_FILTER_PREFIX = "attr."
+
+
+# region Helpers
+def encode_cursor(last_id: int, price: Optional[int] = None) -> str:
+    """Opaque keyset cursor just past `last_id`, at `price` when ordered by price."""
+    position = {"id": last_id} if price is None else {"price": price, "id": last_id}
+    payload = json.dumps(position, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, with_price: bool = False) -> Tuple[int, Optional[int]]:
+    """Return the (id, price) of a cursor; `with_price` requires a price cursor."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded))
+        last_id = position["id"]
+        price = position["price"] if with_price else None
+        if not isinstance(last_id, int) or (with_price and not isinstance(price, int)):
+            raise ValueError(position)
+        return last_id, price
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        )
+
+
+async def export_lines(
+    request: Request,
+    region: Optional[str],
+    period: Optional[str],
+    after_id: int,
+    chunk_size: int,
+):
+    """Yield one NDJSON line per product, in id order, starting after `after_id`.
+
+    Products are read through a server-side cursor in chunks of `chunk_size`,
+    and each chunk's attributes and pricing are loaded on a second connection,
+    so memory stays flat regardless of catalog size. Both connections go to
+    the same read replica (or the primary).
+    """
+    stream_session = await open_read_session(request)
+    session = AsyncSession(stream_session.bind)
+    async with stream_session, session:
+        await dimension_cache.ensure_loaded(session)
+        products_query = (
+            select(*PRODUCT_COLUMNS)
+            .where(Products.id > after_id)
+            .order_by(Products.id)
+            .execution_options(yield_per=chunk_size)
+        )
+        available = pricing_filter(dimension_cache, region, period)
+        if available is not None:
+            products_query = products_query.where(available)
+
+        try:
+            result = await stream_session.stream(products_query)
+            async for products in result.partitions(chunk_size):
+                payloads = await build_product_payloads(
+                    session, dimension_cache, products, region, period
+                )
+                yield b"".join(orjson.dumps(payload) + b"\n" for payload in payloads)
+        except Exception as e:
+            # Headers are already sent, so re-raise to abort the connection; a
+            # clean end would look like a complete export. The client resumes
+            # from the last id it got
+            logger.error(f"Exception in export_products: {e}")
+            raise
+
+
+def parse_attribute_filters(request: Request) -> Dict[str, List[str]]:
+    """Collect `attr.NAME=VALUE` query parameters; repeated names are OR-ed."""
+    filters = defaultdict(list)
+    for key, value in request.query_params.multi_items():
+        if key.startswith(ATTRIBUTE_FILTER_PREFIX) and len(key) > len(
+            ATTRIBUTE_FILTER_PREFIX
+        ):
+            filters[key[len(ATTRIBUTE_FILTER_PREFIX) :]].append(value)
+    return dict(filters)
+
+
+def parse_fieldset(
+    value: Optional[str], allowed: Sequence[str], name: str
+) -> Optional[List[str]]:
+    """Parse a comma-separated `fields`/`include` value; None when not given."""
+    if value is None:
+        return None
+    names = [part.strip() for part in value.split(",") if part.strip()]
+    unknown = [part for part in names if part not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown {name}: {', '.join(unknown)} "
+            f"(expected any of {', '.join(allowed)})",
+        )
+    return names
+
+
+def shape_item(
+    item: dict,
+    region: Optional[str] = None,
+    period: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+    include: Optional[List[str]] = None,
+) -> dict:
+    """Narrow a full product document to the filters, fields and includes."""
+    if region or period:
+        # Documents carry every price; keep the ones the filters ask for
+        months = int(period) if period else None
+        item["pricing"] = [
+            price
+            for price in item["pricing"]
+            if (not region or price["region_code"] == region)
+            and (months is None or price["rental_period_months"] == months)
+        ]
+    if fields is not None or include is not None:
+        keys = [column.key for column in product_columns(fields)]
+        keys += PRODUCT_RELATIONS if include is None else include
+        item = {key: item[key] for key in keys if key in item}
+    return item
+
+
+def parse_id_list(ids: str) -> List[int]:
+    """Parse "1,2,3" into unique ids, keeping the order they were given in."""
+    try:
+        product_ids = [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ids must be a comma-separated list of integers",
+        )
+    if any(not 1 <= product_id <= MAX_PRODUCT_ID for product_id in product_ids):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+            detail=f"ids must be between 1 and {MAX_PRODUCT_ID}",
+        )
+    return list(dict.fromkeys(product_ids))
+
+
+# region Paging
+async def page_by_id(
+    session,
+    dimensions,
+    region,
+    period,
+    page,
+    page_size,
+    after_id,
+    with_total,
+    columns=PRODUCT_COLUMNS,
+):
+    """A page in id order, filtered in SQL. Returns (products, total, next cursor)."""
+    count_query = select(func.count(Products.id))
+    products_query = select_product_rows(columns).order_by(Products.id)
+
+    # Only page through products that are priced for the requested region/period
+    available = pricing_filter(dimensions, region, period)
+    if available is not None:
+        count_query = count_query.where(available)
+        products_query = products_query.where(available)
+
+    if after_id is not None:
+        # Seek past the last product of the previous page instead of OFFSET
+        products_query = products_query.where(Products.id > after_id)
+    else:
+        products_query = products_query.offset((page - 1) * page_size)
+
+    total_count = None
+    if with_total:
+        total_count = (await session.exec(count_query)).one()
+
+    # Get paginated products, plus one row to know whether another page exists
+    products = (await session.exec(products_query.limit(page_size + 1))).all()
+    next_cursor = None
+    if len(products) > page_size:
+        next_cursor = encode_cursor(products[page_size - 1].id)
+    return products[:page_size], total_count, next_cursor
+
+
+def page_from_snapshot(
+    snapshot: CatalogSnapshot,
+    region,
+    period,
+    page,
+    page_size,
+    after_id,
+    with_total,
+    fields=None,
+    include=None,
+) -> Optional[Response]:
+    """A whole /products/ response in id order, read from the catalog snapshot.
+
+    Returns None when a product was changed here since the snapshot was built,
+    so the page, its filters and its counts come from the database instead.
+    """
+    if not catalog_snapshot.is_current(snapshot):
+        return None
+    product_ids = snapshot.product_ids(region, period)
+    if after_id is None:
+        start = (page - 1) * page_size
+    else:
+        start = int(np.searchsorted(product_ids, after_id, side="right"))
+    page_ids = product_ids[start : start + page_size + 1].tolist()
+    next_cursor = None
+    if len(page_ids) > page_size:
+        next_cursor = encode_cursor(page_ids[page_size - 1])
+
+    documents = [snapshot.document(product_id) for product_id in page_ids[:page_size]]
+    if region or period or fields is not None or include is not None:
+        documents = [
+            orjson.dumps(
+                shape_item(orjson.loads(document), region, period, fields, include)
+            )
+            for document in documents
+        ]
+
+    total_count = len(product_ids) if with_total else None
+    meta = {
+        "current_page": page if after_id is None else None,
+        "page_size": page_size,
+        "total_items": total_count,
+        "total_pages": ceil(total_count / page_size) if with_total else None,
+        "next_cursor": next_cursor,
+        "facets": None,
+    }
+    # Stitch the stored documents together without decoding them
+    body = b"".join(
+        (b'{"items":[', b",".join(documents), b"],", orjson.dumps(meta)[1:])
+    )
+    return Response(content=body, media_type="application/json")
+
+
+async def page_by_bitmap(
+    session,
+    matched: int,
+    page,
+    page_size,
+    after_id,
+    with_total,
+    columns=PRODUCT_COLUMNS,
+):
+    """A page in id order read from the set bits of a facet index bitmap."""
+    if after_id is None:
+        first = nth_set_bit(matched, (page - 1) * page_size)
+        start_after = first - 1 if first is not None else None
+    else:
+        start_after = after_id
+    page_ids = []
+    if start_after is not None:
+        page_ids = ids_after(matched, start_after, page_size + 1)
+
+    products = []
+    if page_ids:
+        products = (
+            await session.exec(
+                select_product_rows(columns)
+                .where(Products.id.in_(page_ids[:page_size]))
+                .order_by(Products.id)
+            )
+        ).all()
+    next_cursor = None
+    if len(page_ids) > page_size:
+        next_cursor = encode_cursor(page_ids[page_size - 1])
+    return products, matched.bit_count() if with_total else None, next_cursor
+
+
+async def page_by_price(
+    session,
+    price_conditions: list,
+    descending: bool,
+    page,
+    page_size,
+    after: Optional[Tuple[int, int]],
+    with_total,
+    columns=PRODUCT_COLUMNS,
+):
+    """A page in (price, id) order, read from the region/period/price index.
+
+    `price_conditions` must pin the region and period, so both the range and
+    the ordering come straight off ix_productpricings_region_period_price.
+    """
+    total_count = None
+    if with_total:
+        total_count = (
+            await session.exec(
+                select(func.count(ProductPricings.id)).where(*price_conditions)
+            )
+        ).one()
+
+    price, product_id = ProductPricings.price, ProductPricings.product_id
+    pricing_query = select(product_id, price).where(*price_conditions)
+    if descending:
+        pricing_query = pricing_query.order_by(price.desc(), product_id.desc())
+    else:
+        pricing_query = pricing_query.order_by(price, product_id)
+    if after is not None:
+        last_id, last_price = after
+        if descending:
+            seek = or_(
+                price < last_price, and_(price == last_price, product_id < last_id)
+            )
+        else:
+            seek = or_(
+                price > last_price, and_(price == last_price, product_id > last_id)
+            )
+        pricing_query = pricing_query.where(seek)
+    else:
+        pricing_query = pricing_query.offset((page - 1) * page_size)
+
+    rows = (await session.exec(pricing_query.limit(page_size + 1))).all()
+    next_cursor = None
+    if len(rows) > page_size:
+        last = rows[page_size - 1]
+        next_cursor = encode_cursor(last.product_id, last.price)
+    rows = rows[:page_size]
+
+    products = {}
+    if rows:
+        products = {
+            product.id: product
+            for product in (
+                await session.exec(
+                    select_product_rows(columns).where(
+                        Products.id.in_([row.product_id for row in rows])
+                    )
+                )
+            ).all()
+        }
+    ordered = [products[row.product_id] for row in rows if row.product_id in products]
+    return ordered, total_count, next_cursor
+
 
 # region API
-@product_router.get("/products/", response_model=PaginatedProductResponse)
+@product_router.get("/products/", response_model=PaginatedSparseProductResponse)
 async def get_products(
-    session: SessionDep,
+    request: Request,
     page: int = Query(default=1, ge=1, description="Page number"),
     page_size: int = Query(
         default=10, ge=1, le=100, description="Number of items per page"
     ),
     region: str = Query(default=None, description="Region (eg: MY, SG)"),
     period: str = Query(default=None, description="Period (Month: 3,6,12)"),
+    min_price: int = Query(
+        default=None, ge=0, description="Lowest price for the region and period"
+    ),
+    max_price: int = Query(
+        default=None, ge=0, description="Highest price for the region and period"
+    ),
+    sort: Literal["price_asc", "price_desc"] = Query(
+        default=None,
+        description="Order by price for the region and period (default: id)",
+    ),
+    after: str = Query(
+        default=None,
+        description="Cursor from a previous next_cursor; switches to keyset pagination",
+    ),
+    with_total: bool = Query(
+        default=None,
+        description="Include total_items/total_pages (default: on for pages, off for cursors)",
+    ),
+    facets: bool = Query(
+        default=False,
+        description="Include value counts per attribute under the current filters",
+    ),
+    fields: str = Query(
+        default=None,
+        description="Comma-separated product columns to return (eg: id,name); id is "
+        "always returned",
+    ),
+    include: str = Query(
+        default=None,
+        description="Comma-separated relations to return: attributes, pricing "
+        "(default: both; empty for none)",
+    ),
 ):
-    try:
+    """List products in id order, or by price when filtering or sorting on it.
 
-        # Calculate offset
-        offset = (page - 1) * page_size
-        total_count = session.exec(select(func.count(Products.id))).one()
-        total_pages = ceil(total_count / page_size)
+    Filter on attributes with `attr.NAME=VALUE` parameters (eg:
+    `?attr.RAM=16GB&attr.Panel=IPS`); repeating a name matches any of its
+    values. Attribute filters and facet counts are answered from the in-memory
+    facet index. Price filters and sorting need both `region` and `period`;
+    price-filtered pages come cheapest first unless `sort=price_desc`.
+    `fields` and `include` trim the items, and the queries behind them (eg:
+    `?fields=name&include=pricing&region=SG&period=12` for a grid view).
+    """
+    by_price = min_price is not None or max_price is not None or sort is not None
+    if by_price and not (region and period):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="min_price, max_price and sort need both region and period",
+        )
+    position = decode_cursor(after, with_price=by_price) if after else None
+    after_id = position[0] if position else None
+    if with_total is None:
+        with_total = after_id is None
+    attribute_filters = parse_attribute_filters(request)
+    fields = parse_fieldset(fields, PRODUCT_FIELDS, "fields")
+    include = parse_fieldset(include, PRODUCT_RELATIONS, "include")
+    columns = product_columns(fields)
 
-        # Get paginated products
-        products = session.exec(select(Products).offset(offset).limit(page_size)).all()
+    try:
+        snapshot = catalog_snapshot.current()
+        if snapshot is not None and not (by_price or attribute_filters or facets):
+            response = page_from_snapshot(
+                snapshot,
+                region,
+                period,
+                page,
+                page_size,
+                after_id,
+                with_total,
+                fields,
+                include,
+            )
+            if response is not None:
+                return response
 
-        response_data = []
+        # Only now take a connection, so snapshot pages never touch the pool
+        async with await open_read_session(request) as session:
+            await dimension_cache.ensure_loaded(session)
+            dimensions = dimension_cache
 
-        for product in products:
-            # Get attributes for this product
-            attributes = session.exec(
-                select(Attributes).where(Attributes.product_id == product.id)
-            ).all()
+            price_conditions = None
+            if by_price:
+                price_conditions = pricing_conditions(dimensions, region, period)
+                if price_conditions is None:
+                    # Unknown region or period: nothing can match
+                    price_conditions = [false()]
+                if min_price is not None:
+                    price_conditions.append(ProductPricings.price >= min_price)
+                if max_price is not None:
+                    price_conditions.append(ProductPricings.price <= max_price)
+
+            matched = None
+            facet_counts = None
+            if (attribute_filters and not by_price) or facets:
+                await facet_index.ensure_current(session)
+                available = facet_index.pricing_bitmap(dimensions, region, period)
+                if min_price is not None or max_price is not None:
+                    in_range = await session.exec(
+                        select(ProductPricings.product_id).where(*price_conditions)
+                    )
+                    available &= bitmap_of(in_range.all())
+                matched = facet_index.filter(available, attribute_filters)
+                if facets:
+                    facet_counts = facet_index.facet_counts(
+                        available,
+                        attribute_filters,
+                        settings.FACET_MAX_VALUES,
+                        settings.FACET_COUNT_MAX_VALUES,
+                    )
 
-            # Get pricing information with region and rental period details
-            pricing_query = (
-                select(ProductPricings, Regions, RentalPeriods)
-                .join(Regions, ProductPricings.region_id == Regions.id)
-                .join(
-                    RentalPeriods, ProductPricings.rental_period_id == RentalPeriods.id
+            if by_price:
+                # The database walks the price index; attributes are probed per row
+                products, total_count, next_cursor = await page_by_price(
+                    session,
+                    price_conditions
+                    + attribute_conditions(
+                        ProductPricings.product_id, attribute_filters
+                    ),
+                    sort == "price_desc",
+                    page,
+                    page_size,
+                    position,
+                    with_total,
+                    columns,
                 )
-                .where(ProductPricings.product_id == product.id)
-            )
-            if region:
-                pricing_query = pricing_query.where(Regions.code == region)
-            if period:
-                pricing_query = pricing_query.where(RentalPeriods.month == period)
-
-            pricing_results = session.exec(pricing_query).all()
-
-            # Format pricing data
-            pricing_data = [
-                PricingResponse(
-                    rental_period_months=rental_period.month,
-                    price=pricing.price,
-                    region_name=region.name,
-                    region_code=region.code,
+            elif attribute_filters:
+                # Page through the matching bits instead of querying the attributes
+                products, total_count, next_cursor = await page_by_bitmap(
+                    session, matched, page, page_size, after_id, with_total, columns
+                )
+            else:
+                products, total_count, next_cursor = await page_by_id(
+                    session,
+                    dimensions,
+                    region,
+                    period,
+                    page,
+                    page_size,
+                    after_id,
+                    with_total,
+                    columns,
                 )
-                for pricing, region, rental_period in pricing_results
-            ]
-
-            # Format attributes
-            attribute_data = [
-                AttributeResponse(name=attr.name, value=attr.value)
-                for attr in attributes
-            ]
-
-            # Create the product response
-            product_response = ProductResponse(
-                id=product.id,
-                name=product.name,
-                description=product.description,
-                sku=product.sku,
-                detail=product.detail,
-                attributes=attribute_data,
-                pricing=pricing_data,
-            )
 
-            response_data.append(product_response)
+            # Attach the included relations for the whole page at once
+            response_data = await build_product_payloads(
+                session, dimensions, products, region, period, fields, include
+            )
 
-        return PaginatedProductResponse(
-            current_page=page,
-            page_size=page_size,
-            total_items=total_count,
-            total_pages=total_pages,
-            items=response_data,
-        )
+            total_pages = None
+            if total_count is not None:
+                total_pages = ceil(total_count / page_size)
+            payload = {
+                "current_page": page if after_id is None else None,
+                "page_size": page_size,
+                "total_items": total_count,
+                "total_pages": total_pages,
+                "next_cursor": next_cursor,
+                "items": response_data,
+                "facets": facet_counts,
+            }
+            sparse = fields is not None or include is not None
+            if settings.FAST_JSON_RESPONSES or sparse:
+                # Rows are already in the response shape; serialize them once.
+                # Trimmed items would not pass ProductResponse validation anyway
+                return FastJSONResponse(payload)
+            return PaginatedProductResponse(**payload)
     except Exception as e:
         logger.error(f"Exception in get_products: {e}")
         return JSONResponse(
-            content={"detail": {e}}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+            content={"detail": str(e)},
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         )
 
 
-@product_router.get("/products/{product_id}", response_model=ProductResponse)
-async def get_product(product_id: int, session: SessionDep):
-    try:
-        # Get the product
-        product = session.exec(
-            select(Products).where(Products.id == product_id)
-        ).first()
-
-        if not product:
-            return JSONResponse(status_code=404, content="Product not found")
+@product_router.get(
+    "/products/export",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}}},
+)
+async def export_products(
+    request: Request,
+    region: str = Query(default=None, description="Region (eg: MY, SG)"),
+    period: str = Query(default=None, description="Period (Month: 3,6,12)"),
+    after_id: int = Query(
+        default=0, ge=0, description="Resume after this product id (last one received)"
+    ),
+    chunk_size: int = Query(
+        default=500, ge=1, le=5000, description="Products fetched per round trip"
+    ),
+):
+    """Stream the whole catalog as NDJSON, one ProductResponse document per line."""
+    return StreamingResponse(
+        export_lines(request, region, period, after_id, chunk_size),
+        media_type="application/x-ndjson",
+    )
 
-        # Get attributes
-        attributes = session.exec(
-            select(Attributes).where(Attributes.product_id == product_id)
-        ).all()
 
-        # Get pricing information
-        pricing_query = (
-            select(ProductPricings, Regions, RentalPeriods)
-            .join(Regions, ProductPricings.region_id == Regions.id)
-            .join(RentalPeriods, ProductPricings.rental_period_id == RentalPeriods.id)
-            .where(ProductPricings.product_id == product_id)
+@product_router.get("/products/batch", response_model=BatchProductResponse)
+async def get_products_batch(
+    session: ReadSessionDep,
+    dimensions: DimensionsDep,
+    ids: str = Query(description="Comma-separated product ids (eg: 1,2,3)"),
+):
+    """Look up many products at once; unknown ids are listed in not_found."""
+    product_ids = parse_id_list(ids)
+    if len(product_ids) > settings.PRODUCT_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.PRODUCT_BATCH_MAX_SIZE} ids per request",
         )
 
-        pricing_results = session.exec(pricing_query).all()
+    try:
+        documents = await get_product_documents(session, dimensions, product_ids)
+        found = [documents[pid] for pid in product_ids if pid in documents]
+        not_found = [pid for pid in product_ids if pid not in documents]
 
-        # Format pricing data
-        pricing_data = [
-            PricingResponse(
-                rental_period_months=rental_period.month,
-                price=pricing.price,
-                region_name=region.name,
-                region_code=region.code,
+        # Stitch the stored documents together without decoding them
+        body = b"".join(
+            (
+                b'{"items":[',
+                b",".join(found),
+                b'],"not_found":',
+                orjson.dumps(not_found),
+                b"}",
             )
-            for pricing, region, rental_period in pricing_results
-        ]
+        )
+        return Response(content=body, media_type="application/json")
+    except Exception as e:
+        logger.error(f"Exception in get_products_batch: {e}")
+        return JSONResponse(
+            content={"detail": str(e)},
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
 
-        # Format attributes
-        attribute_data = [
-            AttributeResponse(name=attr.name, value=attr.value) for attr in attributes
-        ]
 
-        # Create and return the response
-        return ProductResponse(
-            id=product.id,
-            name=product.name,
-            description=product.description,
-            sku=product.sku,
-            detail=product.detail,
-            attributes=attribute_data,
-            pricing=pricing_data,
+@product_router.get("/products/search", response_model=SearchProductResponse)
+async def search_products(
+    session: ReadSessionDep,
+    dimensions: DimensionsDep,
+    q: str = Query(min_length=1, max_length=200, description="Search terms"),
+    page: int = Query(default=1, ge=1, description="Page number"),
+    page_size: int = Query(
+        default=10, ge=1, le=100, description="Number of items per page"
+    ),
+):
+    """Full-text search over product fields and attributes, best matches first."""
+    try:
+        await search_index.ensure_current(session)
+        ranked_ids, total_count = search_index.search(q, limit=page * page_size)
+        page_ids = ranked_ids[(page - 1) * page_size :]
+
+        documents = await get_product_documents(session, dimensions, page_ids)
+        found = [documents[pid] for pid in page_ids if pid in documents]
+        meta = {
+            "query": q,
+            "current_page": page,
+            "page_size": page_size,
+            "total_items": total_count,
+            "total_pages": ceil(total_count / page_size),
+        }
+        # Stitch the stored documents together without decoding them
+        body = b"".join(
+            (b'{"items":[', b",".join(found), b"],", orjson.dumps(meta)[1:])
         )
+        return Response(content=body, media_type="application/json")
+    except Exception as e:
+        logger.error(f"Exception in search_products: {e}")
+        return JSONResponse(
+            content={"detail": str(e)},
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+
+
+@product_router.get("/products/{product_id}", response_model=SparseProductResponse)
+async def get_product(
+    product_id: int,
+    request: Request,
+    fields: str = Query(
+        default=None,
+        description="Comma-separated product columns to return (eg: id,name); id is "
+        "always returned",
+    ),
+    include: str = Query(
+        default=None,
+        description="Comma-separated relations to return: attributes, pricing "
+        "(default: both; empty for none)",
+    ),
+):
+    """One product; `fields` and `include` trim the stored document."""
+    fields = parse_fieldset(fields, PRODUCT_FIELDS, "fields")
+    include = parse_fieldset(include, PRODUCT_RELATIONS, "include")
+    try:
+        body = None
+        snapshot = catalog_snapshot.current()
+        if snapshot is not None and catalog_snapshot.is_current(snapshot, [product_id]):
+            body = snapshot.document(product_id)
+
+        if body is None:
+            # Only now take a connection, so snapshot hits never touch the
+            # database. Single primary-key lookup of the pre-rendered document
+            async with await open_read_session(request) as session:
+                await dimension_cache.ensure_loaded(session)
+                body = await get_product_document(session, dimension_cache, product_id)
+
+        if body is None:
+            return JSONResponse(status_code=404, content="Product not found")
+
+        if fields is not None or include is not None:
+            body = orjson.dumps(
+                shape_item(orjson.loads(body), fields=fields, include=include)
+            )
+        return Response(content=body, media_type="application/json")
     except Exception as e:
         logger.error(f"Exception in get_product: {e}")
         return JSONResponse(
-            content={"detail": {e}}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+            content={"detail": str(e)},
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         )
 
 
 @product_router.get("/regions", response_model=List[ResgionResponse])
-async def get_regions(session: SessionDep):
+async def get_regions(dimensions: DimensionsDep):
     try:
-        regions = session.exec(select(Regions)).all()
-        return regions
+        # Served from the dimension cache, no query once it is loaded
+        return dimensions.region_list()
     except Exception as e:
         logger.error(f"Exception in get_regions: {e}")
         return JSONResponse(
-            content={"detail": {e}}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+            content={"detail": str(e)},
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         )
@@ -0,0 +1,73 @@
+import orjson
+from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import JSONResponse, Response
+from loguru import logger
+
+from dimensions import DimensionsDep
+from endpoints.base_models import QuoteRequest, QuoteResponse
+from pricing_matrix import MISSING, pricing_matrix
+from settings import settings
+
+quote_router = APIRouter(tags=["Quote"])
+
+
+# region API
+@quote_router.post("/quotes", response_model=QuoteResponse)
+async def create_quote(quote: QuoteRequest, dimensions: DimensionsDep):
+    """Price a cart of product/region/period lines in one pass.
+
+    Lines whose product is not priced for that region and period get null
+    prices, are listed by position in `unavailable` and left out of `total`.
+    """
+    if len(quote.lines) > settings.QUOTE_MAX_LINES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.QUOTE_MAX_LINES} lines per quote",
+        )
+
+    try:
+        # Prices come from memory; a connection is only taken to (re)build it
+        await pricing_matrix.ensure_current()
+        lines = quote.lines
+        # Unknown regions/periods map to id -1, which the matrix never prices
+        unit_prices, line_totals = pricing_matrix.quote(
+            [line.product_id for line in lines],
+            [dimensions.region_id(line.region) or -1 for line in lines],
+            [dimensions.period_id(line.period) or -1 for line in lines],
+            [line.quantity for line in lines],
+        )
+        priced = line_totals != MISSING
+
+        items = []
+        unavailable = []
+        for position, (line, unit_price, line_total) in enumerate(
+            zip(lines, unit_prices.tolist(), line_totals.tolist())
+        ):
+            if unit_price == MISSING:
+                unavailable.append(position)
+                unit_price = line_total = None
+            items.append(
+                {
+                    "product_id": line.product_id,
+                    "region": line.region,
+                    "period": line.period,
+                    "quantity": line.quantity,
+                    "unit_price": unit_price,
+                    "line_total": line_total,
+                }
+            )
+
+        body = orjson.dumps(
+            {
+                "lines": items,
+                "total": int(line_totals[priced].sum()),
+                "unavailable": unavailable,
+            }
+        )
+        return Response(content=body, media_type="application/json")
+    except Exception as e:
+        logger.error(f"Exception in create_quote: {e}")
+        return JSONResponse(
+            content={"detail": str(e)},
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
@@ -0,0 +1,13 @@
+import orjson
+from fastapi.responses import JSONResponse
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered by orjson from plain dicts and lists.
+
+    Returning it from a handler skips the response_model validation and
+    serialization, so the payload must already match the declared model.
+    """
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
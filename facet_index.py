@@ -0,0 +1,289 @@
+"""Bitmap index over attribute values and pricing availability.
+
+Every (attribute name, value) pair and every (region id, rental period id)
+pricing combination maps to a bitmap held in a Python int, where bit N is set
+when product N has that attribute value or price. Facet filters are then a few
+big-int AND/ORs, counts are `int.bit_count()`, and pages are read straight
+from the set bits in id order, so neither ever scans the Attributes table.
+Kept current like the search index (see `CatalogIndex`).
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func
+from sqlmodel import select
+
+from catalog_events import watch_commits
+from catalog_index import CatalogIndex, written_product_ids
+from dimensions import DimensionCache
+from models import Attributes, ProductPricings, Products
+from settings import settings
+
+BUILD_BATCH_SIZE = 50000
+
+
+def from_bits(bits: bytearray) -> int:
+    return int.from_bytes(bits, "little")
+
+
+def bitmap_of(product_ids: Iterable[int]) -> int:
+    """Bitmap with the bit of every id in `product_ids` set."""
+    product_ids = list(product_ids)
+    if not product_ids:
+        return 0
+    bits = bytearray(max(product_ids) // 8 + 1)
+    for product_id in product_ids:
+        bits[product_id >> 3] |= 1 << (product_id & 7)
+    return from_bits(bits)
+
+
+def nth_set_bit(bitmap: int, n: int) -> Optional[int]:
+    """Position of the n-th (0-based) set bit, or None if there are fewer."""
+    if n >= bitmap.bit_count():
+        return None
+    # Smallest position whose prefix holds more than n set bits
+    low, high = 0, bitmap.bit_length()
+    while low < high:
+        middle = (low + high) // 2
+        if (bitmap & ((1 << (middle + 1)) - 1)).bit_count() > n:
+            high = middle
+        else:
+            low = middle + 1
+    return low
+
+
+def ids_after(bitmap: int, after_id: int, limit: int) -> List[int]:
+    """Up to `limit` set bit positions greater than `after_id`, ascending."""
+    start = after_id + 1
+    remaining = bitmap >> start
+    ids = []
+    while remaining and len(ids) < limit:
+        offset = (remaining & -remaining).bit_length() - 1
+        ids.append(start + offset)
+        remaining >>= offset + 1
+        start += offset + 1
+    return ids
+
+
+class FacetIndex(CatalogIndex):
+    name = "facet index"
+
+    def __init__(self, max_age_seconds: float):
+        super().__init__(max_age_seconds)
+        self.products = 0
+        # Attribute name -> value -> bitmap of products with that value
+        self.values: Dict[str, Dict[str, int]] = {}
+        # (region id, rental period id) -> bitmap of products priced for it
+        self.priced: Dict[Tuple[int, int], int] = {}
+        # Attribute name -> (value, product count), most common first
+        self.value_counts: Dict[str, List[Tuple[str, int]]] = {}
+
+    def __len__(self) -> int:
+        return self.products.bit_count()
+
+    # region Maintenance
+    @staticmethod
+    async def load_rows(session, product_ids=None, after_id=0, limit=None):
+        """Product ids, attribute rows and pricing keys for ids or an id range."""
+        query = select(Products.id).order_by(Products.id)
+        if product_ids is not None:
+            query = query.where(Products.id.in_(product_ids))
+        else:
+            query = query.where(Products.id > after_id).limit(limit)
+        ids = (await session.exec(query)).all()
+        if not ids:
+            return ids, [], []
+
+        def in_batch(column):
+            if product_ids is None:
+                # A contiguous id range; cheaper than a long IN list
+                return column.between(ids[0], ids[-1])
+            return column.in_(ids)
+
+        attributes = (
+            await session.exec(
+                select(Attributes.product_id, Attributes.name, Attributes.value).where(
+                    in_batch(Attributes.product_id)
+                )
+            )
+        ).all()
+        pricing = (
+            await session.exec(
+                select(
+                    ProductPricings.product_id,
+                    ProductPricings.region_id,
+                    ProductPricings.rental_period_id,
+                ).where(in_batch(ProductPricings.product_id))
+            )
+        ).all()
+        return ids, attributes, pricing
+
+    @staticmethod
+    def group(attributes, pricing):
+        values = defaultdict(lambda: defaultdict(list))
+        for product_id, name, value in attributes:
+            values[name][value].append(product_id)
+        priced = defaultdict(list)
+        for product_id, region_id, period_id in pricing:
+            priced[(region_id, period_id)].append(product_id)
+        return values, priced
+
+    async def _build(self, session):
+        max_id = (await session.exec(select(func.max(Products.id)))).one() or 0
+        size = max_id // 8 + 1
+        product_bits = bytearray(size)
+        priced_bits = defaultdict(lambda: bytearray(size))
+        # Id lists, not full-catalog buffers: there can be a value per product
+        value_ids = defaultdict(lambda: defaultdict(list))
+
+        def set_bits(bits: bytearray, product_ids: Iterable[int]):
+            for product_id in product_ids:
+                # Products added while building are picked up as stale ones
+                if product_id <= max_id:
+                    bits[product_id >> 3] |= 1 << (product_id & 7)
+
+        last_id = 0
+        while True:
+            ids, attributes, pricing = await self.load_rows(
+                session, after_id=last_id, limit=BUILD_BATCH_SIZE
+            )
+            if not ids:
+                break
+            set_bits(product_bits, ids)
+            values, priced = self.group(attributes, pricing)
+            for name, by_value in values.items():
+                for value, product_ids in by_value.items():
+                    value_ids[name][value].extend(
+                        product_id for product_id in product_ids if product_id <= max_id
+                    )
+            for key, product_ids in priced.items():
+                set_bits(priced_bits[key], product_ids)
+            last_id = ids[-1]
+
+        self.values = {
+            name: {value: bitmap_of(ids) for value, ids in by_value.items() if ids}
+            for name, by_value in value_ids.items()
+        }
+        self.value_counts = self.count_values(self.values)
+        self.priced = {key: from_bits(bits) for key, bits in priced_bits.items()}
+        self.products = from_bits(product_bits)
+
+    async def _reindex(self, session, product_ids: Set[int]):
+        ids, attributes, pricing = await self.load_rows(
+            session, product_ids=list(product_ids)
+        )
+        # Clear the products everywhere with one AND per bitmap, then set them again
+        keep = ~bitmap_of(product_ids)
+        values, priced = self.group(attributes, pricing)
+        names = set(self.values) | set(values)
+        new_values = {}
+        for name in names:
+            by_value = {
+                value: bitmap & keep
+                for value, bitmap in self.values.get(name, {}).items()
+            }
+            for value, value_ids in values.get(name, {}).items():
+                by_value[value] = by_value.get(value, 0) | bitmap_of(value_ids)
+            # Drop values no product has any more
+            by_value = {value: bitmap for value, bitmap in by_value.items() if bitmap}
+            if by_value:
+                new_values[name] = by_value
+
+        new_priced = {key: bitmap & keep for key, bitmap in self.priced.items()}
+        for key, priced_ids in priced.items():
+            new_priced[key] = new_priced.get(key, 0) | bitmap_of(priced_ids)
+
+        # Swap whole dicts so readers never see a half-applied update
+        self.values = new_values
+        self.value_counts = self.count_values(new_values)
+        self.priced = {key: bitmap for key, bitmap in new_priced.items() if bitmap}
+        self.products = (self.products & keep) | bitmap_of(ids)
+
+    @staticmethod
+    def count_values(values: Dict[str, Dict[str, int]]):
+        value_counts = {}
+        for name, by_value in values.items():
+            counts = [(value, bitmap.bit_count()) for value, bitmap in by_value.items()]
+            counts.sort(key=lambda count: (-count[1], count[0]))
+            value_counts[name] = counts
+        return value_counts
+
+    # region Queries
+    def pricing_bitmap(
+        self,
+        dimensions: DimensionCache,
+        region: Optional[str] = None,
+        period: Optional[str] = None,
+    ) -> int:
+        """Products priced for `region`/`period`; every product when neither is set."""
+        if not region and not period:
+            return self.products
+        region_id = dimensions.region_id(region) if region else None
+        period_id = dimensions.period_id(period) if period else None
+        if (region and region_id is None) or (period and period_id is None):
+            return 0
+        bitmap = 0
+        for (priced_region, priced_period), priced in self.priced.items():
+            if region_id not in (None, priced_region):
+                continue
+            if period_id not in (None, priced_period):
+                continue
+            bitmap |= priced
+        return bitmap
+
+    def attribute_bitmap(self, name: str, values: Iterable[str]) -> int:
+        """Products having any of `values` for attribute `name`."""
+        by_value = self.values.get(name, {})
+        bitmap = 0
+        for value in values:
+            bitmap |= by_value.get(value, 0)
+        return bitmap
+
+    def filter(self, base: int, filters: Dict[str, List[str]]) -> int:
+        for name, values in filters.items():
+            base &= self.attribute_bitmap(name, values)
+        return base
+
+    def facet_counts(
+        self,
+        base: int,
+        filters: Dict[str, List[str]],
+        max_values: int,
+        max_counted: int,
+    ) -> List[dict]:
+        """Value counts per attribute name under the current filters.
+
+        Each name is counted with every filter applied except its own, so the
+        other values of a filtered attribute stay visible. Unfiltered counts
+        are precomputed; filtered ones only cover the `max_counted` values
+        most common across the catalog, so a free-text-like attribute costs
+        no more than that per request.
+        """
+        facets = []
+        for name in sorted(self.values):
+            others = {key: values for key, values in filters.items() if key != name}
+            scope = self.filter(base, others)
+            if scope == self.products:
+                counts = [
+                    {"value": value, "count": count}
+                    for value, count in self.value_counts[name][:max_values]
+                ]
+            else:
+                by_value = self.values[name]
+                counts = [
+                    {"value": value, "count": (by_value[value] & scope).bit_count()}
+                    for value, _ in self.value_counts[name][:max_counted]
+                ]
+            counts = [count for count in counts if count["count"]]
+            if not counts:
+                continue
+            counts.sort(key=lambda count: (-count["count"], count["value"]))
+            facets.append({"name": name, "values": counts[:max_values]})
+        return facets
+
+
+facet_index = FacetIndex(max_age_seconds=settings.FACET_INDEX_MAX_AGE_SECONDS)
+watch_commits(
+    (Products, Attributes, ProductPricings),
+    lambda written: facet_index.mark_stale(written_product_ids(written)),
+)
@@ -0,0 +1,222 @@
+"""Synthetic catalog generator for load and capacity testing.
+
+Unlike create_data.py, which inserts a handful of hand-written products,
+this writes catalogs of any size with bulk executemany inserts, one
+transaction per batch of products. The same --seed on an empty database
+always produces the same rows.
+
+    python generate_data.py --products 1000000 --attributes 20 --regions 4 --periods 3
+    python generate_data.py --url sqlite:///load.db --create-tables --products 50000
+"""
+import argparse
+import random
+from datetime import datetime
+from time import perf_counter
+from typing import Dict, List
+
+from sqlalchemy import create_engine, func, insert, select
+from sqlmodel import SQLModel
+
+from models import Attributes, ProductPricings, Products, Regions, RentalPeriods
+
+REGIONS = [
+    ("SG", "Singapore"),
+    ("MY", "Malaysia"),
+    ("TH", "Thailand"),
+    ("VN", "Vietnam"),
+    ("ID", "Indonesia"),
+    ("PH", "Philippines"),
+    ("HK", "Hong Kong"),
+    ("TW", "Taiwan"),
+    ("JP", "Japan"),
+    ("KR", "South Korea"),
+    ("AU", "Australia"),
+    ("NZ", "New Zealand"),
+]
+PERIOD_MONTHS = [3, 6, 12, 18, 24, 36]
+
+BRANDS = ["Apple", "Dell", "Lenovo", "HP", "Asus", "Acer", "Samsung", "LG", "Sony"]
+CATEGORIES = ["Laptop", "Monitor", "Tablet", "Phone", "Camera", "Console", "Desktop"]
+ATTRIBUTE_VALUES = {
+    "Processor": ["M2", "M3 Pro", "Intel i5", "Intel i7", "Ryzen 5", "Ryzen 7"],
+    "RAM": ["8GB", "16GB", "32GB", "64GB"],
+    "Storage": ["256GB SSD", "512GB SSD", "1TB SSD", "2TB SSD"],
+    "Display": ["13-inch", "14-inch", "15.6-inch", "27-inch", "32-inch"],
+    "Panel": ["IPS", "OLED", "VA", "Mini LED"],
+    "Color": ["Black", "Silver", "White", "Space Gray", "Blue"],
+    "Weight": ["0.5kg", "1.2kg", "1.6kg", "2.1kg", "5kg"],
+    "Warranty": ["1 year", "2 years", "3 years"],
+    "Connectivity": ["Wi-Fi 6", "Wi-Fi 6E", "5G", "Bluetooth 5.3"],
+    "Battery": ["40Wh", "60Wh", "80Wh", "99Wh"],
+}
+
+
+def ensure_dimensions(conn, regions: int, periods: int):
+    """Create the first `regions` regions and `periods` rental periods if missing.
+
+    Returns (region id -> price multiplier, period id -> months).
+    """
+    wanted_regions = [
+        REGIONS[i] if i < len(REGIONS) else (f"R{i + 1}", f"Region {i + 1}")
+        for i in range(regions)
+    ]
+    existing = dict(conn.execute(select(Regions.code, Regions.id)).all())
+    missing = [
+        {"code": code, "name": name}
+        for code, name in wanted_regions
+        if code not in existing
+    ]
+    if missing:
+        conn.execute(insert(Regions), missing)
+        existing = dict(conn.execute(select(Regions.code, Regions.id)).all())
+    region_ids = [existing[code] for code, _ in wanted_regions]
+
+    wanted_months = [
+        PERIOD_MONTHS[i] if i < len(PERIOD_MONTHS) else 12 * (i - 2)
+        for i in range(periods)
+    ]
+    existing = dict(conn.execute(select(RentalPeriods.month, RentalPeriods.id)).all())
+    missing = [{"month": month} for month in wanted_months if month not in existing]
+    if missing:
+        conn.execute(insert(RentalPeriods), missing)
+        existing = dict(
+            conn.execute(select(RentalPeriods.month, RentalPeriods.id)).all()
+        )
+
+    region_multipliers = {
+        region_id: 1 + index * 0.5 for index, region_id in enumerate(region_ids)
+    }
+    period_months = {existing[month]: month for month in wanted_months}
+    return region_multipliers, period_months
+
+
+def attribute_names(count: int) -> List[str]:
+    names = list(ATTRIBUTE_VALUES)[:count]
+    return names + [f"Spec {i + 1}" for i in range(count - len(names))]
+
+
+def generate(
+    engine,
+    products: int,
+    attributes: int,
+    regions: int,
+    periods: int,
+    seed: int,
+    batch_size: int,
+    coverage: float,
+) -> Dict[str, int]:
+    """Insert the synthetic catalog and return the number of rows per table."""
+    rng = random.Random(seed)
+    names = attribute_names(attributes)
+    counts = {"products": 0, "attributes": 0, "productpricings": 0}
+
+    with engine.begin() as conn:
+        region_multipliers, period_months = ensure_dimensions(conn, regions, periods)
+        first_id = (conn.execute(select(func.max(Products.id))).scalar() or 0) + 1
+
+    now = datetime.now()
+    for start in range(first_id, first_id + products, batch_size):
+        ids = range(start, min(start + batch_size, first_id + products))
+        product_rows, attribute_rows, pricing_rows = [], [], []
+        for product_id in ids:
+            brand = rng.choice(BRANDS)
+            category = rng.choice(CATEGORIES)
+            product_rows.append(
+                {
+                    "id": product_id,
+                    "name": f"{brand} {category} {product_id}",
+                    "description": f"{brand} {category.lower()} for rent",
+                    "sku": f"{brand[:3].upper()}-{category[:3].upper()}-{product_id}",
+                    "detail": f"Generated {category.lower()} #{product_id}",
+                    "created_at": now,
+                    "updated_at": now,
+                }
+            )
+            for name in names:
+                values = ATTRIBUTE_VALUES.get(name)
+                value = rng.choice(values) if values else str(rng.randint(1, 100))
+                attribute_rows.append(
+                    {"name": name, "value": value, "product_id": product_id}
+                )
+
+            base_price = rng.randint(20, 2000)
+            for region_id, multiplier in region_multipliers.items():
+                for period_id, months in period_months.items():
+                    if coverage < 1 and rng.random() >= coverage:
+                        continue
+                    pricing_rows.append(
+                        {
+                            "product_id": product_id,
+                            "region_id": region_id,
+                            "rental_period_id": period_id,
+                            # Longer rentals get a lower monthly rate
+                            "price": int(base_price * multiplier * months ** 0.8),
+                        }
+                    )
+
+        # One transaction and one executemany per table for the whole batch
+        with engine.begin() as conn:
+            conn.execute(insert(Products), product_rows)
+            if attribute_rows:
+                conn.execute(insert(Attributes), attribute_rows)
+            if pricing_rows:
+                conn.execute(insert(ProductPricings), pricing_rows)
+        counts["products"] += len(product_rows)
+        counts["attributes"] += len(attribute_rows)
+        counts["productpricings"] += len(pricing_rows)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic catalog.")
+    parser.add_argument(
+        "--url", help="Database URL (default: SQL_URL/DB_NAME from the environment)"
+    )
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--attributes", type=int, default=20)
+    parser.add_argument("--regions", type=int, default=2)
+    parser.add_argument("--periods", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--batch-size", type=int, default=5000, help="Products per transaction"
+    )
+    parser.add_argument(
+        "--coverage",
+        type=float,
+        default=1.0,
+        help="Share of product/region/period combinations that get a price",
+    )
+    parser.add_argument(
+        "--create-tables", action="store_true", help="Create missing tables first"
+    )
+    args = parser.parse_args()
+
+    if args.url:
+        engine = create_engine(args.url)
+    else:
+        from settings import engine
+    if args.create_tables:
+        SQLModel.metadata.create_all(engine)
+
+    started = perf_counter()
+    counts = generate(
+        engine,
+        products=args.products,
+        attributes=args.attributes,
+        regions=args.regions,
+        periods=args.periods,
+        seed=args.seed,
+        batch_size=args.batch_size,
+        coverage=args.coverage,
+    )
+    elapsed = perf_counter() - started
+
+    total = sum(counts.values())
+    for table, rows in counts.items():
+        print(f"{table:<16} {rows:>12,} rows")
+    rate = total / elapsed if elapsed else 0
+    print(f"{'total':<16} {total:>12,} rows in {elapsed:.1f}s ({rate:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,40 @@
-from contextlib import asynccontextmanager
+import asyncio
+from contextlib import asynccontextmanager, suppress
 
 from fastapi import FastAPI
-from loguru import logger
-from sqlmodel import Session, select
 
-from create_data import create_test_data
 from endpoints.api import api_router
-from models import Regions
-from settings import engine
+from replicas import ReadYourWritesMiddleware
+from request_metrics import RequestMetricsMiddleware
+from response_cache import ResponseCacheMiddleware, response_cache
+from warmup import warm_up
 
 
 # region App
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    try:
-        with Session(engine) as session:
-            region_exists = session.exec(select(Regions).limit(1)).first()
-            if not region_exists:
-                print("Run create_test_data.")
-                create_test_data(session=session)
-            else:
-                print("NOT Run create_test_data.")
-
-    except Exception as e:
-        logger.error(f"Failed to load startup data: {e}")
+    # Serve immediately; /ready turns green once the background warm-up is done.
+    # Seeding sample data is opt-in (SEED_ON_STARTUP) or `python create_data.py`
+    warmup_task = asyncio.create_task(warm_up())
     yield
+    warmup_task.cancel()
+    with suppress(asyncio.CancelledError):
+        await warmup_task
 
 
 app = FastAPI(lifespan=lifespan)
 app.include_router(api_router)
-
+app.add_middleware(ReadYourWritesMiddleware)
+app.add_middleware(
+    ResponseCacheMiddleware,
+    cache=response_cache,
+    paths=[
+        r"/products/",
+        r"/products/\d+",
+        r"/products/batch",
+        r"/products/search",
+        r"/regions",
+    ],
+)
+# Outermost, so cached responses are timed too
+app.add_middleware(RequestMetricsMiddleware)
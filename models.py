@@ -3,6 +3,7 @@ from typing import Optional
 
 import bcrypt
 from pydantic import EmailStr
+from sqlalchemy import Column, Index, LargeBinary
 from sqlmodel import Field, SQLModel
 
 metadata = SQLModel.metadata
@@ -22,21 +23,40 @@ class Attributes(SQLModel, table=True):
     id: int = Field(primary_key=True)
     name: str
     value: str
-    product_id: int | None = Field(foreign_key="products.id")
+    product_id: int | None = Field(foreign_key="products.id", index=True)
 
 
 class Regions(SQLModel, table=True):
     id: int = Field(primary_key=True)
     name: str
-    code: str
+    code: str = Field(unique=True, index=True)
 
 
 class RentalPeriods(SQLModel, table=True):
     id: int = Field(primary_key=True)
-    month: int
+    month: int = Field(unique=True, index=True)
 
 
 class ProductPricings(SQLModel, table=True):
+    __table_args__ = (
+        # One price per product/region/period; also serves the per-product lookups
+        Index(
+            "ix_productpricings_product_region_period",
+            "product_id",
+            "region_id",
+            "rental_period_id",
+            unique=True,
+        ),
+        # Covers price-range filters and price ordering within a region/period
+        Index(
+            "ix_productpricings_region_period_price",
+            "region_id",
+            "rental_period_id",
+            "price",
+            "product_id",
+        ),
+    )
+
     id: int = Field(primary_key=True)
     region_id: int = Field(foreign_key="regions.id")
     rental_period_id: int = Field(foreign_key="rentalperiods.id")
@@ -44,16 +64,28 @@ class ProductPricings(SQLModel, table=True):
     price: int
 
 
+class ProductDocuments(SQLModel, table=True):
+    """Pre-rendered ProductResponse JSON, rebuilt from the normalized tables."""
+
+    product_id: int = Field(primary_key=True, foreign_key="products.id")
+    # MEDIUMBLOB on MySQL; products with many attributes outgrow a 64KB BLOB
+    body: bytes = Field(sa_column=Column(LargeBinary(length=2**24), nullable=False))
+    updated_at: datetime = Field(default_factory=datetime.now)
+
+
 class User(SQLModel, table=True):
     id: int | None = Field(primary_key=True)
-    username: str
+    username: str = Field(unique=True, index=True)
     email: EmailStr
     hashed_password: str
 
-    def set_password(self, password: str):
-        """Hash the password and store it."""
+    def set_password(self, password: str, rounds: int = 12):
+        """Hash the password and store it.
+
+        Blocks for the whole bcrypt run; request handlers use passwords.py instead.
+        """
         self.hashed_password = bcrypt.hashpw(
-            password.encode("utf-8"), bcrypt.gensalt()
+            password.encode("utf-8"), bcrypt.gensalt(rounds)
         ).decode("utf-8")
 
     def verify_password(self, password: str) -> bool:
@@ -0,0 +1,64 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import bcrypt
+from fastapi import HTTPException, status
+
+from settings import settings
+
+# bcrypt releases the GIL, so a small thread pool hashes in parallel while the
+# event loop keeps serving other requests
+_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt"
+)
+# Caps queued hashing work so login storms can't pile up behind the pool
+_slots = asyncio.Semaphore(settings.PASSWORD_HASH_WORKERS)
+
+
+async def _run_hashing(func, *args):
+    try:
+        await asyncio.wait_for(
+            _slots.acquire(), timeout=settings.PASSWORD_HASH_QUEUE_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many concurrent logins, retry shortly",
+            headers={"Retry-After": "1"},
+        )
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, partial(func, *args))
+    finally:
+        _slots.release()
+
+
+def _hash(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode(
+        "utf-8"
+    )
+
+
+def _verify(password: str, hashed_password: str) -> bool:
+    return bcrypt.checkpw(password.encode("utf-8"), hashed_password.encode("utf-8"))
+
+
+async def hash_password(password: str) -> str:
+    """Hash `password` with the configured work factor, off the event loop."""
+    return await _run_hashing(_hash, password, settings.BCRYPT_ROUNDS)
+
+
+async def verify_password(password: str, hashed_password: str) -> bool:
+    """Check `password` against a stored bcrypt hash, off the event loop."""
+    return await _run_hashing(_verify, password, hashed_password)
+
+
+def needs_rehash(hashed_password: str) -> bool:
+    """True when the hash was made with a different work factor than configured."""
+    # bcrypt hashes look like $2b$<rounds>$<salt+hash>
+    try:
+        rounds = int(hashed_password.split("$")[2])
+    except (IndexError, ValueError):
+        return True
+    return rounds != settings.BCRYPT_ROUNDS
@@ -0,0 +1,187 @@
+"""Dense in-memory copy of ProductPricings for vectorized price lookups.
+
+`PricingMatrix.prices[product_id, region_index, period_index]` holds the
+monthly price as an int32 (4 bytes per product, region and period), or
+MISSING where a product is not priced. Region and rental
+period ids map to axis positions through lookup arrays built from the
+Regions/RentalPeriods tables, so pricing a whole cart is a handful of NumPy
+fancy-indexing operations. Kept current like the search index (see
+`CatalogIndex`); a change to regions or rental periods rebuilds it.
+"""
+from typing import Sequence, Set, Tuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlmodel import select
+
+from catalog_events import watch_commits
+from catalog_index import CatalogIndex, written_product_ids
+from models import ProductPricings, Products, Regions, RentalPeriods
+from settings import settings
+
+MISSING = -1
+# ProductPricings.price is an INT column; int64 is only used for line totals
+PRICE_DTYPE = np.int32
+BUILD_BATCH_SIZE = 100000
+
+
+def lookup_array(ids: Sequence[int]) -> np.ndarray:
+    """Array mapping each id to its position in `ids`, and other ids to -1."""
+    lookup = np.full(max(ids, default=0) + 1, -1, dtype=np.int64)
+    lookup[np.asarray(ids, dtype=np.int64)] = np.arange(len(ids))
+    return lookup
+
+
+def positions(lookup: np.ndarray, ids: np.ndarray) -> np.ndarray:
+    """Positions of `ids` in a lookup array; -1 for ids it does not know."""
+    known = (ids >= 0) & (ids < len(lookup))
+    result = np.full(len(ids), -1, dtype=np.int64)
+    result[known] = lookup[ids[known]]
+    return result
+
+
+class PricingMatrix(CatalogIndex):
+    name = "pricing matrix"
+
+    def __init__(self, max_age_seconds: float):
+        super().__init__(max_age_seconds)
+        self.prices = np.full((0, 0, 0), MISSING, dtype=PRICE_DTYPE)
+        self.region_index = lookup_array([])
+        self.period_index = lookup_array([])
+
+    def __len__(self) -> int:
+        return int(np.any(self.prices != MISSING, axis=(1, 2)).sum())
+
+    def invalidate(self):
+        """Rebuild from scratch on the next read (the axes changed)."""
+        self.built_at = None
+
+    # region Maintenance
+    @staticmethod
+    def _assign(
+        prices: np.ndarray,
+        region_index: np.ndarray,
+        period_index: np.ndarray,
+        rows: Sequence[Tuple[int, int, int, int]],
+    ):
+        """Write (product id, region id, period id, price) rows into `prices`."""
+        if not rows:
+            return
+        product_ids, region_ids, period_ids, values = np.asarray(
+            rows, dtype=np.int64
+        ).T
+        region_positions = positions(region_index, region_ids)
+        period_positions = positions(period_index, period_ids)
+        # Rows for products or dimensions added since the build wait for a
+        # re-index; prices an int32 cannot hold are left out rather than wrapped
+        keep = (
+            (product_ids < prices.shape[0])
+            & (region_positions >= 0)
+            & (period_positions >= 0)
+            & (values >= 0)
+            & (values <= np.iinfo(PRICE_DTYPE).max)
+        )
+        prices[
+            product_ids[keep], region_positions[keep], period_positions[keep]
+        ] = values[keep]
+
+    async def _build(self, session):
+        region_ids = (await session.exec(select(Regions.id).order_by(Regions.id))).all()
+        period_ids = (
+            await session.exec(select(RentalPeriods.id).order_by(RentalPeriods.id))
+        ).all()
+        max_id = (await session.exec(select(func.max(Products.id)))).one() or 0
+        prices = np.full(
+            (max_id + 1, len(region_ids), len(period_ids)), MISSING, dtype=PRICE_DTYPE
+        )
+        region_index = lookup_array(region_ids)
+        period_index = lookup_array(period_ids)
+
+        last_id = 0
+        while True:
+            rows = (
+                await session.exec(
+                    select(
+                        ProductPricings.id,
+                        ProductPricings.product_id,
+                        ProductPricings.region_id,
+                        ProductPricings.rental_period_id,
+                        ProductPricings.price,
+                    )
+                    .where(ProductPricings.id > last_id)
+                    .order_by(ProductPricings.id)
+                    .limit(BUILD_BATCH_SIZE)
+                )
+            ).all()
+            if not rows:
+                break
+            self._assign(prices, region_index, period_index, [row[1:] for row in rows])
+            last_id = rows[-1][0]
+
+        self.prices = prices
+        self.region_index = region_index
+        self.period_index = period_index
+
+    async def _reindex(self, session, product_ids: Set[int]):
+        rows = (
+            await session.exec(
+                select(
+                    ProductPricings.product_id,
+                    ProductPricings.region_id,
+                    ProductPricings.rental_period_id,
+                    ProductPricings.price,
+                ).where(ProductPricings.product_id.in_(product_ids))
+            )
+        ).all()
+        prices = self.prices
+        needed = max(product_ids) + 1
+        if needed > prices.shape[0]:
+            # Grow with headroom so a run of new products does not copy each time
+            grown = np.full(
+                (max(needed, prices.shape[0] * 5 // 4), *prices.shape[1:]),
+                MISSING,
+                dtype=PRICE_DTYPE,
+            )
+            grown[: prices.shape[0]] = prices
+            prices = grown
+        prices[np.fromiter(product_ids, dtype=np.int64)] = MISSING
+        self._assign(prices, self.region_index, self.period_index, rows)
+        self.prices = prices
+
+    # region Quotes
+    def quote(
+        self,
+        product_ids: Sequence[int],
+        region_ids: Sequence[int],
+        period_ids: Sequence[int],
+        quantities: Sequence[int],
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Unit prices and line totals of many lines at once; MISSING if unpriced."""
+        product_ids = np.asarray(product_ids, dtype=np.int64)
+        quantities = np.asarray(quantities, dtype=np.int64)
+        region_positions = positions(self.region_index, np.asarray(region_ids))
+        period_positions = positions(self.period_index, np.asarray(period_ids))
+
+        known = (
+            (product_ids >= 0)
+            & (product_ids < self.prices.shape[0])
+            & (region_positions >= 0)
+            & (period_positions >= 0)
+        )
+        # Gathered into int64, so line totals are computed without wrapping
+        unit_prices = np.full(len(product_ids), MISSING, dtype=np.int64)
+        unit_prices[known] = self.prices[
+            product_ids[known], region_positions[known], period_positions[known]
+        ]
+        line_totals = np.where(
+            unit_prices != MISSING, unit_prices * quantities, MISSING
+        )
+        return unit_prices, line_totals
+
+
+pricing_matrix = PricingMatrix(max_age_seconds=settings.PRICING_MATRIX_MAX_AGE_SECONDS)
+watch_commits(
+    (Products, ProductPricings),
+    lambda written: pricing_matrix.mark_stale(written_product_ids(written)),
+)
+watch_commits((Regions, RentalPeriods), lambda written: pricing_matrix.invalidate())
@@ -0,0 +1,200 @@
+"""Materialized product documents.
+
+Each row of `ProductDocuments` holds the rendered `ProductResponse` JSON of one
+product, so detail reads are a single primary-key lookup. Documents are
+dropped in the same transaction as any ORM write to the product, its
+attributes or its pricing, and rebuilt on the next read. Bulk loads that
+bypass the ORM should be followed by a full rebuild:
+
+    python product_documents.py --batch-size 500
+"""
+import argparse
+import asyncio
+from datetime import datetime
+from time import perf_counter
+from typing import Dict, Iterable, Optional, Sequence, Set
+
+import orjson
+from loguru import logger
+from sqlalchemy import delete, event, inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from dimensions import DimensionCache, dimension_cache
+from endpoints.loaders import build_product_payloads
+from models import (
+    Attributes,
+    ProductDocuments,
+    ProductPricings,
+    Products,
+    Regions,
+    RentalPeriods,
+)
+from replicas import on_primary
+from settings import async_engine
+
+
+async def build_documents(
+    session, dimensions: DimensionCache, products: Sequence[Products]
+) -> Dict[int, bytes]:
+    """Render the full (unfiltered) document of each product."""
+    version = dimensions.version
+    payloads = await build_product_payloads(session, dimensions, products)
+    if dimensions.version != version:
+        # A price named a region or period the cache did not know yet (or the
+        # tables changed meanwhile); reload them rather than store a document
+        # missing those prices
+        await dimensions.ensure_loaded(session)
+        payloads = await build_product_payloads(session, dimensions, products)
+    return {payload["id"]: orjson.dumps(payload) for payload in payloads}
+
+
+async def get_product_documents(
+    session, dimensions: DimensionCache, product_ids: Sequence[int]
+) -> Dict[int, bytes]:
+    """Return the rendered documents of many products, building any missing ones.
+
+    Uses one query when every document is stored, plus a fixed number of
+    queries for the misses. Ids without a product are left out of the result.
+    """
+    if not product_ids:
+        return {}
+    documents = dict(
+        (
+            await session.exec(
+                select(ProductDocuments.product_id, ProductDocuments.body).where(
+                    ProductDocuments.product_id.in_(product_ids)
+                )
+            )
+        ).all()
+    )
+    missing = [product_id for product_id in product_ids if product_id not in documents]
+    if not missing:
+        return documents
+
+    # `session` may be a lagging replica, so stored documents are rendered
+    # from the primary's rows
+    async with on_primary(session) as primary:
+        products = (
+            await primary.exec(select(Products).where(Products.id.in_(missing)))
+        ).all()
+        if not products:
+            return documents
+
+        built = await build_documents(primary, dimensions, products)
+        primary.add_all(
+            ProductDocuments(product_id=product_id, body=body)
+            for product_id, body in built.items()
+        )
+        try:
+            await primary.commit()
+        except IntegrityError:
+            # A concurrent request stored some of the same documents first
+            await primary.rollback()
+    documents.update(built)
+    return documents
+
+
+async def get_product_document(
+    session, dimensions: DimensionCache, product_id: int
+) -> Optional[bytes]:
+    """Return the rendered document of a product, or None if it does not exist."""
+    documents = await get_product_documents(session, dimensions, [product_id])
+    return documents.get(product_id)
+
+
+async def rebuild_documents(
+    session,
+    dimensions: DimensionCache,
+    product_ids: Optional[Iterable[int]] = None,
+    batch_size: int = 500,
+) -> int:
+    """Re-render documents for `product_ids`, or for the whole catalog.
+
+    Walks products in id order, one transaction per batch. Returns the number
+    of documents written.
+    """
+    wanted = set(product_ids) if product_ids is not None else None
+    written = 0
+    last_id = 0
+    while True:
+        query = select(Products).where(Products.id > last_id).order_by(Products.id)
+        if wanted is not None:
+            query = query.where(Products.id.in_(wanted))
+        products = (await session.exec(query.limit(batch_size))).all()
+        if not products:
+            return written
+
+        documents = await build_documents(session, dimensions, products)
+        await session.execute(
+            delete(ProductDocuments).where(
+                ProductDocuments.product_id.in_(list(documents))
+            )
+        )
+        now = datetime.now()
+        session.add_all(
+            ProductDocuments(product_id=product_id, body=body, updated_at=now)
+            for product_id, body in documents.items()
+        )
+        await session.commit()
+        written += len(documents)
+        last_id = products[-1].id
+
+
+# region Invalidation
+def _product_ids_of(obj) -> Set[int]:
+    if isinstance(obj, Products):
+        return {obj.id} if obj.id is not None else set()
+    # Reading product_id reloads it when a commit expired the row; the history
+    # adds the previous product when the row is moved to another one
+    history = inspect(obj).attrs.product_id.history
+    return {
+        product_id
+        for product_id in (obj.product_id, *history.deleted)
+        if product_id is not None
+    }
+
+
+for model in (Attributes, ProductPricings):
+    # Load the old product_id before it is overwritten, even on an expired row,
+    # so moving a row also drops the document of the product it left
+    event.listen(model.product_id, "set", lambda *args: None, active_history=True)
+
+
+@event.listens_for(Session, "before_flush")
+def drop_stale_documents(session, flush_context, instances):
+    changed = (*session.new, *session.dirty, *session.deleted)
+    stale_all = any(isinstance(obj, (Regions, RentalPeriods)) for obj in changed)
+    stale_ids = set()
+    for obj in changed:
+        if isinstance(obj, (Products, Attributes, ProductPricings)):
+            stale_ids |= _product_ids_of(obj)
+    if not stale_all and not stale_ids:
+        return
+
+    # Runs before the flush, so documents go before a deleted product's row
+    statement = delete(ProductDocuments)
+    if not stale_all:
+        statement = statement.where(ProductDocuments.product_id.in_(stale_ids))
+    session.connection().execute(statement)
+
+
+async def _rebuild_all(batch_size: int):
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        await dimension_cache.refresh(session)
+        started = perf_counter()
+        written = await rebuild_documents(
+            session, dimension_cache, batch_size=batch_size
+        )
+        elapsed = perf_counter() - started
+    await async_engine.dispose()
+    logger.info(f"Rebuilt {written} product documents in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild every product document.")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(_rebuild_all(args.batch_size))
@@ -0,0 +1,171 @@
+"""Read-replica routing.
+
+Read-only endpoints take `ReadSessionDep`, which is served round-robin by the
+engines in SQL_REPLICA_URLS and by the primary when none are configured. A
+replica that cannot hand out a connection is skipped for
+REPLICA_RETRY_SECONDS and the read moves on to the next one, then to the
+primary. Writes use `settings.open_session` on the primary; once a request
+has committed through one, `ReadYourWritesMiddleware` sets a cookie that pins that
+client's reads to the primary for READ_YOUR_WRITES_SECONDS, so it never reads
+from a replica that has not caught up with its own write.
+"""
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from math import ceil
+from time import monotonic, time
+from typing import Annotated, Dict, List, Optional
+
+from fastapi import Depends, Request
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.orm import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+
+from settings import (
+    async_engine,
+    checkout_session,
+    engine_options,
+    settings,
+    to_async_url,
+)
+
+PRIMARY_COOKIE = "read_primary_until"
+
+
+class ReplicaRouter:
+    """Round-robin over replica engines, skipping the ones recently found down."""
+
+    def __init__(self, engines: List[AsyncEngine], retry_seconds: float):
+        self.engines = engines
+        self.retry_seconds = retry_seconds
+        self.down_until: Dict[int, float] = {}
+        self._next = 0
+
+    def candidates(self) -> List[AsyncEngine]:
+        """Healthy replicas, starting from the next one in round-robin order."""
+        now = monotonic()
+        start = self._next
+        self._next = (self._next + 1) % max(len(self.engines), 1)
+        ordered = self.engines[start:] + self.engines[:start]
+        return [r for r in ordered if self.down_until.get(id(r), 0) <= now]
+
+    def mark_down(self, replica: AsyncEngine, error: Exception):
+        # The first read after the retry window doubles as the health check
+        self.down_until[id(replica)] = monotonic() + self.retry_seconds
+        logger.warning(
+            f"Replica {replica.url.render_as_string(hide_password=True)} is "
+            f"unavailable, retrying in {self.retry_seconds}s: {error}"
+        )
+
+    def mark_up(self, replica: AsyncEngine):
+        self.down_until.pop(id(replica), None)
+
+
+def create_replica_engines(urls: str) -> List[AsyncEngine]:
+    return [
+        create_async_engine(to_async_url(url), **engine_options(url))
+        for url in (url.strip() for url in urls.split(","))
+        if url
+    ]
+
+
+replica_router = ReplicaRouter(
+    create_replica_engines(settings.SQL_REPLICA_URLS),
+    retry_seconds=settings.REPLICA_RETRY_SECONDS,
+)
+
+
+# region Sessions
+def reads_primary(scope) -> bool:
+    """Whether this client wrote recently enough to need the primary."""
+    try:
+        return float(HTTPConnection(scope).cookies.get(PRIMARY_COOKIE, 0)) > time()
+    except ValueError:
+        return False
+
+
+async def open_read_session(request: Request) -> AsyncSession:
+    """A session on a healthy replica, or on the primary if there is none."""
+    if not reads_primary(request.scope):
+        for replica in replica_router.candidates():
+            try:
+                session = await checkout_session(replica)
+            except Exception as e:
+                replica_router.mark_down(replica, e)
+                continue
+            replica_router.mark_up(replica)
+            return session
+    return await checkout_session(async_engine)
+
+
+async def get_read_session(request: Request):
+    async with await open_read_session(request) as session:
+        yield session
+
+
+ReadSessionDep = Annotated[AsyncSession, Depends(get_read_session)]
+
+
+@asynccontextmanager
+async def on_primary(session: Optional[AsyncSession] = None):
+    """`session` if it is bound to the primary, else a new primary session.
+
+    For the writes and index maintenance done on behalf of read requests.
+    """
+    if session is not None and session.bind is async_engine:
+        yield session
+        return
+    async with AsyncSession(async_engine, expire_on_commit=False) as primary:
+        yield primary
+
+
+# region Read-your-writes
+class RequestWrites:
+    def __init__(self):
+        self.committed = False
+
+
+_current: ContextVar[Optional[RequestWrites]] = ContextVar(
+    "request_writes", default=None
+)
+
+
+@event.listens_for(Session, "after_commit")
+def _record_primary_write(session):
+    writes = _current.get()
+    if writes is not None and session.info.get("primary_write"):
+        writes.committed = True
+
+
+class ReadYourWritesMiddleware:
+    """Pin a client's reads to the primary for a while after it writes."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not replica_router.engines:
+            await self.app(scope, receive, send)
+            return
+
+        writes = RequestWrites()
+        token = _current.set(writes)
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and writes.committed:
+                window = settings.READ_YOUR_WRITES_SECONDS
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Set-Cookie",
+                    f"{PRIMARY_COOKIE}={time() + window:.3f}; "
+                    f"Max-Age={ceil(window)}; Path=/; HttpOnly; SameSite=Lax",
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_cookie)
+        finally:
+            _current.reset(token)
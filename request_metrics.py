@@ -0,0 +1,208 @@
+"""Per-request SQL instrumentation.
+
+Engine events count the statements each request runs and the time spent in
+them; `RequestMetricsMiddleware` reports that as a `Server-Timing` header and
+feeds per-route histograms rendered in Prometheus text format by `/metrics`.
+Statements slower than SLOW_QUERY_THRESHOLD_MS are logged with the route that
+ran them, for a SLOW_QUERY_SAMPLE_RATE share of occurrences.
+"""
+import random
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Dict, Optional, Sequence, Tuple
+
+from loguru import logger
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+from replicas import replica_router
+from settings import async_engine, engine, settings
+from ttl_cache import TTLCache
+
+# Seconds, as recommended for Prometheus latency histograms
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+# Requests that match no route share one label to keep cardinality bounded
+UNMATCHED_ROUTE = "unmatched"
+# Request path -> route template it was last routed to
+_route_templates = TTLCache(max_entries=10000, ttl_seconds=3600)
+
+
+class RequestMetrics:
+    """What one request spent in the database so far."""
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.started = perf_counter()
+        self.statements = 0
+        self.db_seconds = 0.0
+
+    @property
+    def route(self) -> str:
+        # The router records the matched route on the shared scope
+        template = getattr(self.scope.get("route"), "path", None)
+        if template is not None:
+            _route_templates.set(self.scope["path"], template)
+            return template
+        # Answered before routing, e.g. a response cache hit for a path that was
+        # routed when it was cached
+        return _route_templates.get(self.scope["path"]) or UNMATCHED_ROUTE
+
+
+_current: ContextVar[Optional[RequestMetrics]] = ContextVar(
+    "request_metrics", default=None
+)
+
+
+# region Histograms
+class Histogram:
+    """Cumulative Prometheus histogram with one series per label set."""
+
+    def __init__(self, name: str, description: str, buckets: Sequence[float]):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Tuple[Tuple[str, str], ...], value: float):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # One count per bucket, then +Inf count and sum
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def render(self) -> list:
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labels, values in sorted(series.items()):
+            label_text = ",".join(f'{key}="{_escape(value)}"' for key, value in labels)
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), values[:-1]):
+                cumulative += count
+                le = bound if bound == "+Inf" else repr(float(bound))
+                lines.append(
+                    f'{self.name}_bucket{{{label_text},le="{le}"}} {cumulative}'
+                )
+            lines.append(f"{self.name}_sum{{{label_text}}} {values[-1]}")
+            lines.append(f"{self.name}_count{{{label_text}}} {cumulative}")
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request to sending its response headers.",
+    LATENCY_BUCKETS,
+)
+request_db_duration = Histogram(
+    "http_request_db_seconds",
+    "Time a request spent executing SQL statements.",
+    LATENCY_BUCKETS,
+)
+request_statements = Histogram(
+    "http_request_db_statements",
+    "SQL statements executed per request.",
+    STATEMENT_BUCKETS,
+)
+HISTOGRAMS = (request_duration, request_db_duration, request_statements)
+
+
+def render_metrics() -> str:
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    return "\n".join(lines) + "\n"
+
+
+# region Engine events
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = perf_counter() - context._query_started
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.statements += 1
+        metrics.db_seconds += elapsed
+
+    if (
+        elapsed * 1000 >= settings.SLOW_QUERY_THRESHOLD_MS
+        and random.random() < settings.SLOW_QUERY_SAMPLE_RATE
+    ):
+        route = metrics.route if metrics is not None else None
+        method = metrics.scope["method"] if metrics is not None else None
+        logger.warning(
+            f"Slow query ({elapsed * 1000:.1f} ms) in {method} {route}: "
+            f"{' '.join(statement.split())[:500]}"
+        )
+
+
+for _engine in (
+    engine,
+    async_engine.sync_engine,
+    *(replica.sync_engine for replica in replica_router.engines),
+):
+    event.listen(_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# region Middleware
+class RequestMetricsMiddleware:
+    """Time each HTTP request and the SQL it runs.
+
+    Timings are taken when the response headers are sent, so streamed bodies
+    only count the work done before their first chunk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metrics = RequestMetrics(scope)
+        token = _current.set(metrics)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                total = perf_counter() - metrics.started
+                self.observe(metrics, total)
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Server-Timing",
+                    f'db;dur={metrics.db_seconds * 1000:.2f};'
+                    f'desc="{metrics.statements} queries", '
+                    f"total;dur={total * 1000:.2f}",
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+
+    @staticmethod
+    def observe(metrics: RequestMetrics, total: float):
+        labels = (("method", metrics.scope["method"]), ("route", metrics.route))
+        request_duration.observe(labels, total)
+        request_db_duration.observe(labels, metrics.db_seconds)
+        request_statements.observe(labels, metrics.statements)
@@ -0,0 +1,140 @@
+import hashlib
+import re
+from typing import Optional, Sequence
+from urllib.parse import parse_qsl, urlencode
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from catalog_events import watch_commits
+from models import Attributes, ProductPricings, Products, Regions, RentalPeriods
+from replicas import reads_primary
+from settings import settings
+from ttl_cache import TTLCache
+
+
+class CachedResponse:
+    def __init__(self, headers: list, body: bytes):
+        self.etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        self.headers = headers
+        self.body = body
+
+
+class ResponseCache(TTLCache):
+    """Rendered catalog responses keyed on path and normalized query string.
+
+    Any commit touching catalog tables in this process clears the cache; the
+    TTL bounds staleness for writes made elsewhere. `generation` lets a request
+    that started before a clear avoid storing what it read.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        super().__init__(max_entries, ttl_seconds)
+        self.generation = 0
+
+    def invalidate(self):
+        self.generation += 1
+        self.clear()
+
+    @staticmethod
+    def make_key(scope) -> tuple:
+        query_string = scope["query_string"].decode("latin-1")
+        query = sorted(parse_qsl(query_string, keep_blank_values=True))
+        return scope["path"], urlencode(query)
+
+
+response_cache = ResponseCache(
+    max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.RESPONSE_CACHE_TTL_SECONDS,
+)
+watch_commits(
+    (Products, Attributes, ProductPricings, Regions, RentalPeriods),
+    lambda written: response_cache.invalidate(),
+)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison, so W/ prefixes are ignored
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
+
+
+class ResponseCacheMiddleware:
+    """Serve cached GET responses for `paths`, answering If-None-Match with 304.
+
+    Hits are answered before routing, so they never check out a DB connection.
+    Only complete 200 responses are cached. Clients pinned to the primary after
+    a write bypass the cache both ways, since entries may come from a replica.
+    """
+
+    def __init__(self, app, cache: ResponseCache, paths: Sequence[str]):
+        self.app = app
+        self.cache = cache
+        self.paths = [re.compile(path) for path in paths]
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "GET"
+            or not any(path.fullmatch(scope["path"]) for path in self.paths)
+            or reads_primary(scope)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        key = self.cache.make_key(scope)
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        cached = self.cache.get(key)
+        if cached is not None:
+            await self.send_cached(cached, if_none_match, send)
+            return
+
+        generation = self.cache.generation
+        start_message = None
+        body = []
+
+        async def capture(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            body.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+
+            if start_message["status"] != 200:
+                await send(start_message)
+                await send({"type": "http.response.body", "body": b"".join(body)})
+                return
+            cached = CachedResponse(list(start_message["headers"]), b"".join(body))
+            if generation == self.cache.generation:
+                self.cache.set(key, cached)
+            await self.send_cached(cached, if_none_match, send)
+
+        await self.app(scope, receive, capture)
+
+    @staticmethod
+    async def send_cached(cached: CachedResponse, if_none_match, send):
+        if etag_matches(if_none_match, cached.etag):
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 304,
+                    "headers": [(b"etag", cached.etag.encode("latin-1"))],
+                }
+            )
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        headers = MutableHeaders(raw=list(cached.headers))
+        headers["etag"] = cached.etag
+        await send(
+            {"type": "http.response.start", "status": 200, "headers": headers.raw}
+        )
+        await send({"type": "http.response.body", "body": cached.body})
@@ -0,0 +1,240 @@
+"""In-process full-text search over products and their attributes.
+
+`SearchIndex` keeps an inverted index (token -> {product id: weight}) over
+Products.name/description/sku/detail and Attributes.name/value. Products
+touched by a commit are re-indexed on the next search, and the whole index is
+rebuilt in the background every SEARCH_INDEX_MAX_AGE_SECONDS (see
+`CatalogIndex`).
+"""
+import heapq
+import re
+from bisect import bisect_left, insort
+from collections import defaultdict
+from math import log
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlmodel import select
+
+from catalog_events import watch_commits
+from catalog_index import CatalogIndex, written_product_ids
+from models import Attributes, Products
+from settings import settings
+
+TOKEN_PATTERN = re.compile(r"\w+")
+# Relative weight of a token found in each field
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "sku": 3.0,
+    "attribute_value": 2.0,
+    "attribute_name": 1.0,
+    "description": 1.0,
+    "detail": 1.0,
+}
+# The last query term also matches longer tokens ("mac" -> "macbook")
+MAX_PREFIX_EXPANSIONS = 50
+PREFIX_MATCH_WEIGHT = 0.5
+BUILD_BATCH_SIZE = 5000
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower()) if text else []
+
+
+def document_weights(product, attributes: Iterable) -> Dict[str, float]:
+    """Token -> weight for one product and its (name, value) attribute pairs."""
+    weights: Dict[str, float] = defaultdict(float)
+    for field in ("name", "sku", "description", "detail"):
+        for token in tokenize(getattr(product, field)):
+            weights[token] += FIELD_WEIGHTS[field]
+    for name, value in attributes:
+        for token in tokenize(name):
+            weights[token] += FIELD_WEIGHTS["attribute_name"]
+        for token in tokenize(value):
+            weights[token] += FIELD_WEIGHTS["attribute_value"]
+    return weights
+
+
+def top_ranked(scores: Dict[int, float], limit: int) -> List[int]:
+    """The `limit` best-scoring ids, ties in ascending id order.
+
+    Never sorts every match: only the ids above the `limit`-th best score are
+    sorted, and the lowest ids are picked from those tied with it.
+    """
+    if limit <= 0:
+        return []
+    if len(scores) <= limit:
+        return sorted(scores, key=lambda pid: (-scores[pid], pid))
+    cutoff = heapq.nlargest(limit, scores.values())[-1]
+    above = []
+    tied = []
+    for pid, score in scores.items():
+        if score > cutoff:
+            above.append(pid)
+        elif score == cutoff:
+            tied.append(pid)
+    above.sort(key=lambda pid: (-scores[pid], pid))
+    return above + heapq.nsmallest(limit - len(above), tied)
+
+
+class SearchIndex(CatalogIndex):
+    name = "search index"
+
+    def __init__(self, max_age_seconds: float):
+        super().__init__(max_age_seconds)
+        self.postings: Dict[str, Dict[int, float]] = {}
+        self.documents: Dict[int, Dict[str, float]] = {}
+        # Sorted vocabulary, for prefix matching of the last query term
+        self.vocabulary: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    # region Maintenance
+    def add(self, product_id: int, weights: Dict[str, float]):
+        self.remove(product_id)
+        if not weights:
+            return
+        self.documents[product_id] = weights
+        for token, weight in weights.items():
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = {}
+                insort(self.vocabulary, token)
+            posting[product_id] = weight
+
+    def remove(self, product_id: int):
+        weights = self.documents.pop(product_id, None)
+        if not weights:
+            return
+        for token in weights:
+            posting = self.postings[token]
+            del posting[product_id]
+            if not posting:
+                del self.postings[token]
+                del self.vocabulary[bisect_left(self.vocabulary, token)]
+
+    @staticmethod
+    async def load_weights(session, product_ids=None, after_id=0, limit=None):
+        """Index weights of products by id list, or of one id-ordered batch."""
+        query = select(
+            Products.id, Products.name, Products.description, Products.sku, Products.detail
+        ).order_by(Products.id)
+        if product_ids is not None:
+            query = query.where(Products.id.in_(product_ids))
+        else:
+            query = query.where(Products.id > after_id).limit(limit)
+        products = (await session.exec(query)).all()
+        if not products:
+            return {}
+
+        attributes = defaultdict(list)
+        ids = [product.id for product in products]
+        rows = await session.exec(
+            select(Attributes.product_id, Attributes.name, Attributes.value).where(
+                Attributes.product_id.in_(ids)
+            )
+        )
+        for product_id, name, value in rows.all():
+            attributes[product_id].append((name, value))
+        return {
+            product.id: document_weights(product, attributes[product.id])
+            for product in products
+        }
+
+    async def _build(self, session):
+        postings: Dict[str, Dict[int, float]] = {}
+        documents: Dict[int, Dict[str, float]] = {}
+        last_id = 0
+        while True:
+            batch = await self.load_weights(
+                session, after_id=last_id, limit=BUILD_BATCH_SIZE
+            )
+            if not batch:
+                break
+            for product_id, weights in batch.items():
+                documents[product_id] = weights
+                for token, weight in weights.items():
+                    postings.setdefault(token, {})[product_id] = weight
+            last_id = max(batch)
+
+        self.postings = postings
+        self.documents = documents
+        self.vocabulary = sorted(postings)
+
+    async def _reindex(self, session, product_ids: Set[int]):
+        weights = await self.load_weights(session, product_ids=list(product_ids))
+        for product_id in product_ids:
+            if product_id in weights:
+                self.add(product_id, weights[product_id])
+            else:
+                self.remove(product_id)
+
+    # region Search
+    def search(self, query: str, limit: int) -> Tuple[List[int], int]:
+        """Ids of the best `limit` matches for `query`, and the total match count.
+
+        Every query term must match. Scores sum each term's field weight times
+        its inverse document frequency; ties go to the lower product id.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not self.documents:
+            return [], 0
+
+        term_postings = []
+        for position, term in enumerate(terms):
+            posting = self.postings.get(term)
+            if position == len(terms) - 1:
+                posting = self._expand_prefix(term, posting)
+            if not posting:
+                return [], 0
+            term_postings.append(posting)
+
+        if len(term_postings) == 1:
+            # A single term's idf is the same for every match; rank on weight alone
+            scores = term_postings[0]
+        else:
+            # Intersect starting from the rarest term
+            term_postings.sort(key=len)
+            candidates = set(term_postings[0])
+            for posting in term_postings[1:]:
+                candidates.intersection_update(posting)
+                if not candidates:
+                    return [], 0
+            total_documents = len(self.documents)
+            scores = dict.fromkeys(candidates, 0.0)
+            for posting in term_postings:
+                idf = log(1 + total_documents / len(posting))
+                for pid in candidates:
+                    scores[pid] += posting[pid] * idf
+
+        return top_ranked(scores, limit), len(scores)
+
+    def _expand_prefix(
+        self, prefix: str, exact: Optional[Dict[int, float]]
+    ) -> Optional[Dict[int, float]]:
+        start = bisect_left(self.vocabulary, prefix)
+        expansions = []
+        for token in self.vocabulary[start : start + MAX_PREFIX_EXPANSIONS + 1]:
+            if not token.startswith(prefix):
+                break
+            if token != prefix:
+                expansions.append(self.postings[token])
+        if not expansions:
+            return exact
+
+        merged = dict(exact or {})
+        for posting in expansions:
+            for pid, weight in posting.items():
+                prefix_weight = weight * PREFIX_MATCH_WEIGHT
+                if merged.get(pid, 0) < prefix_weight:
+                    merged[pid] = prefix_weight
+        return merged
+
+
+search_index = SearchIndex(max_age_seconds=settings.SEARCH_INDEX_MAX_AGE_SECONDS)
+
+
+watch_commits(
+    (Products, Attributes),
+    lambda written: search_index.mark_stale(written_product_ids(written)),
+)
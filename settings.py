@@ -1,10 +1,14 @@
 import os
-from typing import Annotated
+import threading
+from time import perf_counter
 
 from dotenv import load_dotenv
-from fastapi import Depends
 from pydantic_settings import BaseSettings
-from sqlmodel import Session, create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 load_dotenv()
 
@@ -15,6 +19,40 @@ class Settings(BaseSettings):
     SECRET_KEY: str = os.getenv("SECRET_KEY")
     ALGORITHM: str = os.getenv("ALGORITHM", "HS256")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30)
+    DB_ECHO: bool = os.getenv("DB_ECHO", False)
+    DB_POOL_SIZE: int = os.getenv("DB_POOL_SIZE", 5)
+    DB_MAX_OVERFLOW: int = os.getenv("DB_MAX_OVERFLOW", 10)
+    DB_POOL_TIMEOUT: int = os.getenv("DB_POOL_TIMEOUT", 30)
+    DB_POOL_RECYCLE: int = os.getenv("DB_POOL_RECYCLE", 1800)
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", True)
+    DIMENSION_CACHE_TTL_SECONDS: int = os.getenv("DIMENSION_CACHE_TTL_SECONDS", 300)
+    RESPONSE_CACHE_MAX_ENTRIES: int = os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 1024)
+    RESPONSE_CACHE_TTL_SECONDS: int = os.getenv("RESPONSE_CACHE_TTL_SECONDS", 60)
+    FAST_JSON_RESPONSES: bool = os.getenv("FAST_JSON_RESPONSES", False)
+    PRODUCT_BATCH_MAX_SIZE: int = os.getenv("PRODUCT_BATCH_MAX_SIZE", 100)
+    TOKEN_CACHE_MAX_ENTRIES: int = os.getenv("TOKEN_CACHE_MAX_ENTRIES", 10000)
+    TOKEN_CACHE_TTL_SECONDS: int = os.getenv("TOKEN_CACHE_TTL_SECONDS", 300)
+    BCRYPT_ROUNDS: int = os.getenv("BCRYPT_ROUNDS", 12)
+    PASSWORD_HASH_WORKERS: int = os.getenv("PASSWORD_HASH_WORKERS", 2)
+    PASSWORD_HASH_QUEUE_TIMEOUT: float = os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT", 5)
+    SEARCH_INDEX_MAX_AGE_SECONDS: int = os.getenv("SEARCH_INDEX_MAX_AGE_SECONDS", 900)
+    FACET_INDEX_MAX_AGE_SECONDS: int = os.getenv("FACET_INDEX_MAX_AGE_SECONDS", 900)
+    FACET_MAX_VALUES: int = os.getenv("FACET_MAX_VALUES", 50)
+    FACET_COUNT_MAX_VALUES: int = os.getenv("FACET_COUNT_MAX_VALUES", 500)
+    PRICING_MATRIX_MAX_AGE_SECONDS: int = os.getenv(
+        "PRICING_MATRIX_MAX_AGE_SECONDS", 900
+    )
+    QUOTE_MAX_LINES: int = os.getenv("QUOTE_MAX_LINES", 1000)
+    SEED_ON_STARTUP: bool = os.getenv("SEED_ON_STARTUP", False)
+    SLOW_QUERY_THRESHOLD_MS: float = os.getenv("SLOW_QUERY_THRESHOLD_MS", 200)
+    SLOW_QUERY_SAMPLE_RATE: float = os.getenv("SLOW_QUERY_SAMPLE_RATE", 0.1)
+    SQL_REPLICA_URLS: str = os.getenv("SQL_REPLICA_URLS", "")
+    REPLICA_RETRY_SECONDS: float = os.getenv("REPLICA_RETRY_SECONDS", 30)
+    READ_YOUR_WRITES_SECONDS: float = os.getenv("READ_YOUR_WRITES_SECONDS", 5)
+    CATALOG_SNAPSHOT_DIR: str = os.getenv("CATALOG_SNAPSHOT_DIR", "")
+    CATALOG_SNAPSHOT_CHECK_SECONDS: float = os.getenv(
+        "CATALOG_SNAPSHOT_CHECK_SECONDS", 5
+    )
 
     class Config:
         env_file = ".env"
@@ -23,12 +61,123 @@ class Settings(BaseSettings):
 settings = Settings()
 # region Config
 sql_url = f"{settings.SQL_URL}/{settings.DB_NAME}"
-engine = create_engine(sql_url, echo=True)
 
 
-def get_session():
-    with Session(engine) as session:
-        yield session
+def engine_options(url: str) -> dict:
+    """Echo and pool options for an engine, taken from Settings."""
+    options = {
+        "echo": settings.DB_ECHO,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+    database = make_url(url).database
+    # In-memory SQLite is served by a single-connection pool that cannot be sized
+    if not url.startswith("sqlite") or database not in (None, "", ":memory:"):
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+        )
+    return options
 
 
-SessionDep = Annotated[Session, Depends(get_session)]
+engine = create_engine(sql_url, **engine_options(sql_url))
+
+# Async drivers used by the request path, keyed by the sync URL scheme
+ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+    "mysql+mysqldb": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+
+def to_async_url(url: str) -> str:
+    """Swap the driver of a sync database URL for its asyncio counterpart."""
+    scheme, separator, rest = url.partition("://")
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}{separator}{rest}"
+
+
+async_engine = create_async_engine(to_async_url(sql_url), **engine_options(sql_url))
+
+
+class PoolStats:
+    """Connection acquisition timings for the request pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.acquisitions = 0
+            self.timeouts = 0
+            self.total_wait = 0.0
+            self.max_wait = 0.0
+
+    def record_wait(self, seconds: float):
+        with self._lock:
+            self.acquisitions += 1
+            self.total_wait += seconds
+            self.max_wait = max(self.max_wait, seconds)
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self, pool) -> dict:
+        """Combine the pool's live counters with the recorded wait times."""
+
+        def counter(name: str) -> int:
+            # Only QueuePool-style pools expose sizing counters
+            method = getattr(pool, name, None)
+            return method() if method else 0
+
+        with self._lock:
+            avg_wait = self.total_wait / self.acquisitions if self.acquisitions else 0.0
+            return {
+                "pool_size": counter("size"),
+                "checked_out": counter("checkedout"),
+                "idle": counter("checkedin"),
+                # QueuePool reports negative overflow until pool_size is reached
+                "overflow": max(counter("overflow"), 0),
+                "max_overflow": settings.DB_MAX_OVERFLOW,
+                "acquisitions": self.acquisitions,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": round(avg_wait * 1000, 3),
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+            }
+
+
+pool_stats = PoolStats()
+
+
+async def checkout_session(bind) -> AsyncSession:
+    """Open a session on `bind` with its connection already checked out.
+
+    Checking out up front measures the time spent waiting on the pool
+    separately from query time, and surfaces an unreachable database here.
+    """
+    session = AsyncSession(bind, expire_on_commit=False)
+    started = perf_counter()
+    try:
+        await session.connection()
+    except PoolTimeoutError:
+        pool_stats.record_timeout()
+        await session.close()
+        raise
+    except BaseException:
+        await session.close()
+        raise
+    pool_stats.record_wait(perf_counter() - started)
+    return session
+
+
+async def open_session() -> AsyncSession:
+    """A session on the primary for writes, with its connection checked out."""
+    session = await checkout_session(async_engine)
+    # Commits through this session are writes the client should read back
+    session.sync_session.info["primary_write"] = True
+    return session
+
@@ -1,10 +1,31 @@
+from contextlib import contextmanager
+from uuid import uuid4
+
 from fastapi import status
 from fastapi.testclient import TestClient
+from sqlalchemy import event
 from main import app
+from settings import async_engine
 
 client = TestClient(app)
 
 
+@contextmanager
+def recorded_statements():
+    """Collect the SQL statements the app's engine runs inside the block."""
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = async_engine.sync_engine
+    event.listen(engine, "before_cursor_execute", count_statement)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statement)
+
+
 def test_read_main():
     response = client.get("/docs")
     assert response.status_code == 200
@@ -135,3 +156,922 @@ def test_get_product_by_id_not_found():
     assert response.status_code == status.HTTP_404_NOT_FOUND
     data = response.json()
     assert data == "Product not found"
+
+
+def test_unexpected_errors_return_500_with_detail(monkeypatch):
+    """Handler failures come back as JSON 500s carrying the error message."""
+    import endpoints.products
+    from response_cache import response_cache
+
+    async def fail(*args, **kwargs):
+        raise RuntimeError("database went away")
+
+    monkeypatch.setattr(endpoints.products, "page_by_id", fail)
+    monkeypatch.setattr(endpoints.products, "get_product_document", fail)
+    response_cache.invalidate()
+    for url in ("/products/?page_size=7", "/products/1?fields=name"):
+        response = client.get(url)
+        assert response.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
+        assert response.json() == {"detail": "database went away"}
+    response_cache.invalidate()
+
+
+def test_get_products_query_count_is_constant():
+    """The number of SQL statements must not grow with the page size."""
+    from response_cache import response_cache
+
+    response_cache.invalidate()
+
+    with recorded_statements() as statements:
+        client.get("/products/?page_size=2")
+        small_page = len(statements)
+        statements.clear()
+        client.get("/products/?page_size=10")
+        large_page = len(statements)
+
+    assert small_page == large_page
+
+
+def test_register_login_and_read_current_user():
+    """Test the register -> token -> /users/me/ flow."""
+    username = f"user-{uuid4().hex[:8]}"
+    response = client.post(
+        "/register/",
+        json={"username": username, "password": "secret", "email": f"{username}@example.com"},
+    )
+    assert response.status_code == status.HTTP_200_OK
+
+    response = client.post("/token", data={"username": username, "password": "secret"})
+    assert response.status_code == status.HTTP_200_OK
+    token = response.json()["access_token"]
+
+    response = client.get("/users/me/", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["username"] == username
+
+    response = client.post("/token", data={"username": username, "password": "wrong"})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    response = client.post(
+        "/register/",
+        json={"username": username, "password": "other", "email": f"{username}@example.com"},
+    )
+    assert response.status_code == status.HTTP_409_CONFLICT
+    assert response.json()["detail"] == "Username already registered"
+
+
+def test_get_pool_stats():
+    """Test the connection pool statistics endpoint."""
+    client.get("/regions")
+    response = client.get("/pool-stats")
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+
+    assert data["acquisitions"] > 0
+    assert data["checked_out"] >= 0
+    assert data["max_wait_ms"] >= data["avg_wait_ms"] >= 0
+
+
+def test_ready_turns_green_after_warm_up():
+    """/ready is 503 until the background warm-up has loaded pool and caches."""
+    import time
+    from warmup import readiness
+
+    readiness.reset()
+    response = client.get("/ready")
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.json()["status"] == "warming_up"
+
+    with TestClient(app) as started_client:
+        for _ in range(100):
+            response = started_client.get("/ready")
+            if response.status_code == status.HTTP_200_OK:
+                break
+            time.sleep(0.05)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["status"] == "ready"
+    assert response.json()["warmup_ms"] >= 0
+
+
+def test_server_timing_header_and_route_metrics():
+    """Responses report their SQL work and /metrics aggregates it per route."""
+    from response_cache import response_cache
+
+    response_cache.invalidate()
+    response = client.get("/products/?page=1&page_size=2")
+    assert response.status_code == status.HTTP_200_OK
+    server_timing = response.headers["server-timing"]
+    assert server_timing.startswith("db;dur=")
+    assert 'desc="' in server_timing and "total;dur=" in server_timing
+    assert 'desc="0 queries"' not in server_timing
+
+    metrics = client.get("/metrics")
+    assert metrics.status_code == status.HTTP_200_OK
+    assert metrics.headers["content-type"].startswith("text/plain")
+    body = metrics.text
+    assert "# TYPE http_request_duration_seconds histogram" in body
+    assert 'http_request_db_statements_count{method="GET",route="/products/"}' in body
+    assert 'route="/products/",le="+Inf"' in body
+
+
+def test_slow_queries_are_logged_with_route(monkeypatch):
+    """Statements over the threshold are logged with the route that ran them."""
+    from loguru import logger
+    from response_cache import response_cache
+    from settings import settings
+
+    monkeypatch.setattr(settings, "SLOW_QUERY_THRESHOLD_MS", 0)
+    monkeypatch.setattr(settings, "SLOW_QUERY_SAMPLE_RATE", 1.0)
+    messages = []
+    sink = logger.add(messages.append, level="WARNING")
+    try:
+        response_cache.invalidate()
+        client.get("/products/?page=1&page_size=2")
+    finally:
+        logger.remove(sink)
+    assert any("Slow query" in m and "GET /products/" in m for m in messages)
+
+
+def test_get_products_cursor_pagination():
+    """Test walking the catalog with next_cursor."""
+    response = client.get("/products/?page_size=5")
+    assert response.status_code == status.HTTP_200_OK
+    first_page = response.json()
+    assert first_page["next_cursor"] is not None
+
+    response = client.get(f"/products/?page_size=5&after={first_page['next_cursor']}")
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+
+    assert data["total_items"] is None
+    assert data["current_page"] is None
+    first_ids = [item["id"] for item in first_page["items"]]
+    next_ids = [item["id"] for item in data["items"]]
+    assert len(next_ids) == 5
+    assert min(next_ids) > max(first_ids)
+
+    response = client.get(
+        f"/products/?page_size=5&after={first_page['next_cursor']}&with_total=true"
+    )
+    assert response.json()["total_items"] == first_page["total_items"]
+
+
+def test_get_products_invalid_cursor():
+    """Test that a malformed cursor is rejected."""
+    response = client.get("/products/?after=not-a-cursor")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_get_products_filters_apply_to_counts():
+    """Products without pricing for the requested region are not paginated."""
+    response = client.get("/products/?region=SG&period=12")
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["total_items"] > 0
+    for item in data["items"]:
+        assert item["pricing"]
+        assert all(price["region_code"] == "SG" for price in item["pricing"])
+        assert all(price["rental_period_months"] == 12 for price in item["pricing"])
+
+    response = client.get("/products/?region=XX")
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["total_items"] == 0
+    assert data["items"] == []
+
+
+def test_get_regions_served_from_dimension_cache():
+    """/regions reads memory once loaded and reloads after a region is written."""
+    from sqlmodel import Session
+    from models import Regions
+    from response_cache import response_cache
+    from settings import engine, pool_stats
+
+    client.get("/regions")
+    response_cache.invalidate()
+    acquisitions = pool_stats.acquisitions
+    with recorded_statements() as statements:
+        response = client.get("/regions")
+    assert response.status_code == status.HTTP_200_OK
+    assert statements == []
+    # Not even a connection is checked out while the cache is fresh
+    assert pool_stats.acquisitions == acquisitions
+
+    with Session(engine) as session:
+        region = Regions(name="Test Region", code="ZZ")
+        session.add(region)
+        session.commit()
+        try:
+            codes = [item["code"] for item in client.get("/regions").json()]
+            assert "ZZ" in codes
+        finally:
+            session.delete(region)
+            session.commit()
+
+    codes = [item["code"] for item in client.get("/regions").json()]
+    assert "ZZ" not in codes
+
+
+def test_product_responses_carry_etag_and_answer_304():
+    """Cached product reads answer If-None-Match with 304 without touching the DB."""
+    response = client.get("/products/1")
+    assert response.status_code == status.HTTP_200_OK
+    etag = response.headers["etag"]
+
+    with recorded_statements() as statements:
+        response = client.get("/products/1", headers={"If-None-Match": etag})
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response.headers["etag"] == etag
+
+        response = client.get("/products/1")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["etag"] == etag
+    assert statements == []
+
+    # Query parameter order does not matter
+    first = client.get("/products/?page=1&page_size=3")
+    second = client.get(
+        "/products/?page_size=3&page=1",
+        headers={"If-None-Match": first.headers["etag"]},
+    )
+    assert second.status_code == status.HTTP_304_NOT_MODIFIED
+
+
+def test_product_document_rebuilt_after_attribute_change():
+    """Detail reads are served from a stored document that tracks writes."""
+    from sqlmodel import Session, select
+    from dimensions import dimension_cache
+    from models import Attributes, ProductDocuments
+    from settings import engine
+
+    client.get("/products/1")
+    with Session(engine) as session:
+        assert session.get(ProductDocuments, 1) is not None
+
+        attribute = session.exec(
+            select(Attributes).where(Attributes.product_id == 1)
+        ).first()
+        original_value = attribute.value
+        attribute.value = "changed"
+        session.add(attribute)
+        session.commit()
+        try:
+            assert session.get(ProductDocuments, 1) is None
+            data = client.get("/products/1").json()
+            assert "changed" in [attr["value"] for attr in data["attributes"]]
+        finally:
+            attribute.value = original_value
+            session.add(attribute)
+            session.commit()
+
+        # Rows expired by a commit still drop the documents when they change
+        def values(product_id):
+            data = client.get(f"/products/{product_id}").json()
+            return [attr["value"] for attr in data["attributes"]]
+
+        assert "changed" not in values(1)
+        added = Attributes(name="Finish", value="matte", product_id=1)
+        session.add(added)
+        session.commit()
+        assert "matte" in values(1)
+        added.product_id = 2
+        session.add(added)
+        session.commit()
+        assert "matte" not in values(1)
+        assert "matte" in values(2)
+        session.delete(added)
+        session.commit()
+        assert "matte" not in values(2)
+
+    # A region written by another process is loaded before the document is stored
+    import sqlite3
+
+    with sqlite3.connect(engine.url.database) as db:
+        region_id = db.execute(
+            "INSERT INTO regions (name, code) VALUES ('Elsewhere', 'EW')"
+        ).lastrowid
+        period_id = db.execute("SELECT MIN(id) FROM rentalperiods").fetchone()[0]
+        db.execute(
+            "INSERT INTO productpricings (region_id, rental_period_id, product_id, "
+            "price) VALUES (?, ?, 1, 123)",
+            (region_id, period_id),
+        )
+        db.execute("DELETE FROM productdocuments WHERE product_id = 1")
+    try:
+        data = client.get("/products/1").json()
+        assert "EW" in [price["region_code"] for price in data["pricing"]]
+    finally:
+        with sqlite3.connect(engine.url.database) as db:
+            db.execute("DELETE FROM productpricings WHERE region_id = ?", (region_id,))
+            db.execute("DELETE FROM regions WHERE id = ?", (region_id,))
+            db.execute("DELETE FROM productdocuments WHERE product_id = 1")
+        dimension_cache.invalidate()
+
+
+def test_fast_json_responses_match_validated_responses(monkeypatch):
+    """The opt-in orjson path returns the same body as the response_model path."""
+    from response_cache import response_cache
+    from settings import settings
+
+    response_cache.invalidate()
+    validated = client.get("/products/?page_size=5&region=SG").json()
+
+    response_cache.invalidate()
+    monkeypatch.setattr(settings, "FAST_JSON_RESPONSES", True)
+    fast = client.get("/products/?page_size=5&region=SG").json()
+
+    assert fast == validated
+
+
+def test_export_products_ndjson(monkeypatch):
+    """Test streaming the catalog as NDJSON and resuming from a product id."""
+    import json
+    import pytest
+    import endpoints.products
+
+    response = client.get("/products/export?chunk_size=4")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    products = [json.loads(line) for line in response.text.splitlines()]
+    ids = [product["id"] for product in products]
+    assert ids == sorted(ids)
+    assert len(ids) == client.get("/products/").json()["total_items"]
+    assert products[0]["attributes"]
+
+    response = client.get(f"/products/export?after_id={ids[4]}&region=SG&period=3")
+    resumed = [json.loads(line) for line in response.text.splitlines()]
+    assert [product["id"] for product in resumed] == ids[5:]
+    for product in resumed:
+        assert [price["region_code"] for price in product["pricing"]] == ["SG"]
+
+    # A failure mid-stream aborts the response instead of ending it cleanly
+    build = endpoints.products.build_product_payloads
+    chunks = []
+
+    async def failing_build(*args, **kwargs):
+        chunks.append(1)
+        if len(chunks) > 1:
+            raise RuntimeError("lost connection")
+        return await build(*args, **kwargs)
+
+    monkeypatch.setattr(endpoints.products, "build_product_payloads", failing_build)
+    with pytest.raises(RuntimeError):
+        client.get("/products/export?chunk_size=4")
+
+
+def test_get_products_batch():
+    """Test looking up many products in one request."""
+    response = client.get("/products/batch?ids=3,1,999,3")
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+
+    assert [item["id"] for item in data["items"]] == [3, 1]
+    assert data["not_found"] == [999]
+    assert data["items"][0]["attributes"]
+
+    response = client.get("/products/batch?ids=1,abc")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_get_products_batch_enforces_max_size(monkeypatch):
+    """Test that oversized batches and out-of-range ids are rejected."""
+    from settings import settings
+
+    monkeypatch.setattr(settings, "PRODUCT_BATCH_MAX_SIZE", 2)
+    response = client.get("/products/batch?ids=1,2,3")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    response = client.get(f"/products/batch?ids=1,{2**63}")
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+
+
+def test_login_rehashes_password_when_work_factor_changes(monkeypatch):
+    """Logging in upgrades hashes made with a different BCRYPT_ROUNDS."""
+    from sqlmodel import Session, select
+    from models import User
+    from settings import engine, settings
+
+    monkeypatch.setattr(settings, "BCRYPT_ROUNDS", 5)
+    username = f"user-{uuid4().hex[:8]}"
+    client.post(
+        "/register/",
+        json={
+            "username": username,
+            "password": "secret",
+            "email": f"{username}@example.com",
+        },
+    )
+
+    def stored_hash():
+        with Session(engine) as session:
+            return session.exec(
+                select(User.hashed_password).where(User.username == username)
+            ).one()
+
+    assert stored_hash().startswith("$2b$05$")
+
+    monkeypatch.setattr(settings, "BCRYPT_ROUNDS", 4)
+    response = client.post("/token", data={"username": username, "password": "secret"})
+    assert response.status_code == status.HTTP_200_OK
+    assert stored_hash().startswith("$2b$04$")
+
+    response = client.post("/token", data={"username": username, "password": "secret"})
+    assert response.status_code == status.HTTP_200_OK
+
+
+def test_current_user_cache_skips_db_and_tracks_user_changes():
+    """Repeat calls with a token skip the DB until the user is changed."""
+    from sqlmodel import Session, select
+    from models import User
+    from settings import engine
+
+    username = f"user-{uuid4().hex[:8]}"
+    client.post(
+        "/register/",
+        json={
+            "username": username,
+            "password": "secret",
+            "email": f"{username}@example.com",
+        },
+    )
+    token = client.post(
+        "/token", data={"username": username, "password": "secret"}
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    client.get("/users/me/", headers=headers)
+
+    with recorded_statements() as statements:
+        response = client.get("/users/me/", headers=headers)
+    assert response.json()["email"] == f"{username}@example.com"
+    assert statements == []
+
+    with Session(engine) as session:
+        user = session.exec(select(User).where(User.username == username)).one()
+        user.email = f"changed-{username}@example.com"
+        session.add(user)
+        session.commit()
+
+    response = client.get("/users/me/", headers=headers)
+    assert response.json()["email"] == f"changed-{username}@example.com"
+
+
+def test_generate_data_is_deterministic(tmp_path):
+    """The synthetic catalog generator yields the same rows for the same seed."""
+    from sqlalchemy import create_engine, text
+    from sqlmodel import SQLModel
+    from generate_data import generate
+
+    rows = []
+    for name in ("first.db", "second.db"):
+        engine = create_engine(f"sqlite:///{tmp_path / name}")
+        SQLModel.metadata.create_all(engine)
+        counts = generate(
+            engine,
+            products=50,
+            attributes=12,
+            regions=3,
+            periods=2,
+            seed=7,
+            batch_size=20,
+            coverage=0.5,
+        )
+        with engine.connect() as conn:
+            rows.append(
+                conn.execute(
+                    text("SELECT product_id, region_id, price FROM productpricings")
+                ).all()
+            )
+        engine.dispose()
+
+    assert counts["products"] == 50
+    assert counts["attributes"] == 50 * 12
+    assert 0 < counts["productpricings"] < 50 * 3 * 2
+    assert rows[0] == rows[1]
+
+
+def test_search_products_ranks_and_paginates():
+    """Search matches every term across fields and attributes, best first."""
+    response = client.get("/products/search?q=macbook")
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["items"][0]["name"] == "MacBook Pro 14"
+    assert data["total_items"] >= 1
+
+    # Attribute values are indexed, and the last term matches as a prefix
+    data = client.get("/products/search?q=gateron").json()
+    assert any(item["name"] == "Keychron K2" for item in data["items"])
+    data = client.get("/products/search?q=keych").json()
+    assert data["items"][0]["name"] == "Keychron K2"
+
+    # All terms must match
+    assert client.get("/products/search?q=macbook gaming").json()["items"] == []
+
+    first = client.get("/products/search?q=monitor&page_size=1").json()
+    second = client.get("/products/search?q=monitor&page=2&page_size=1").json()
+    assert first["total_items"] == second["total_items"] >= 2
+    assert first["total_pages"] == first["total_items"]
+    assert first["items"][0]["id"] != second["items"][0]["id"]
+
+    from search_index import top_ranked
+
+    scores = {5: 1.0, 3: 2.0, 9: 1.0, 1: 1.0, 7: 3.0}
+    assert top_ranked(scores, 4) == [7, 3, 1, 5]
+    assert top_ranked(scores, 10) == [7, 3, 1, 5, 9]
+
+
+def test_search_index_follows_product_changes():
+    """Committed product changes are visible to the next search."""
+    from sqlmodel import Session
+    from models import Products
+    from settings import engine
+
+    token = f"zq{uuid4().hex[:10]}"
+    client.get("/products/search?q=warmup")
+    with Session(engine) as session:
+        product = Products(name=f"Test {token}", description="Searchable")
+        session.add(product)
+        session.commit()
+        try:
+            data = client.get(f"/products/search?q={token}").json()
+            assert [item["id"] for item in data["items"]] == [product.id]
+        finally:
+            session.delete(product)
+            session.commit()
+
+    assert client.get(f"/products/search?q={token}").json()["items"] == []
+
+
+def test_get_products_attribute_filters_and_facets(monkeypatch):
+    """attr.NAME=VALUE filters narrow the page; facet counts follow the filters."""
+    from response_cache import response_cache
+    from settings import settings
+
+    response_cache.invalidate()
+    response = client.get("/products/?attr.Panel=IPS&facets=true")
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["total_items"] == len(data["items"]) >= 2
+    for item in data["items"]:
+        assert {"name": "Panel", "value": "IPS"} in item["attributes"]
+
+    facets = {facet["name"]: facet["values"] for facet in data["facets"]}
+    # The filtered attribute still lists its other values
+    panel_counts = {value["value"]: value["count"] for value in facets["Panel"]}
+    assert panel_counts["IPS"] == data["total_items"]
+    assert panel_counts["VA"] >= 1
+    # Other attributes are counted within the filtered products only
+    assert sum(value["count"] for value in facets["Resolution"]) <= data["total_items"]
+
+    # Repeated names are OR-ed, different names AND-ed
+    either = client.get("/products/?attr.Panel=IPS&attr.Panel=VA").json()
+    assert either["total_items"] == panel_counts["IPS"] + panel_counts["VA"]
+    both = client.get("/products/?attr.Panel=VA&attr.Refresh%20Rate=240Hz").json()
+    assert [item["name"] for item in both["items"]] == ["Samsung Odyssey G7"]
+    assert client.get("/products/?attr.Panel=Unknown").json()["items"] == []
+
+    # Pages and cursors walk the matching products in id order
+    first = client.get("/products/?attr.Panel=IPS&page_size=1").json()
+    second = client.get("/products/?attr.Panel=IPS&page=2&page_size=1").json()
+    cursor = client.get(
+        f"/products/?attr.Panel=IPS&page_size=1&after={first['next_cursor']}"
+    ).json()
+    assert second["items"][0]["id"] == cursor["items"][0]["id"] > first["items"][0]["id"]
+
+    # Unfiltered counts are precomputed; filtered ones cover the most common values
+    unfiltered = client.get("/products/?facets=true&page_size=1").json()
+    all_panels = {
+        value["value"]: value["count"]
+        for facet in unfiltered["facets"]
+        if facet["name"] == "Panel"
+        for value in facet["values"]
+    }
+    assert all_panels["IPS"] == panel_counts["IPS"]
+    monkeypatch.setattr(settings, "FACET_COUNT_MAX_VALUES", 1)
+    response_cache.invalidate()
+    data = client.get("/products/?attr.Panel=IPS&facets=true").json()
+    # Panel's own filter is excluded, so it is the precomputed, uncapped one
+    capped = [facet for facet in data["facets"] if facet["name"] != "Panel"]
+    assert capped and all(len(facet["values"]) == 1 for facet in capped)
+
+
+def test_facet_index_follows_attribute_changes():
+    """Committed attribute changes are reflected by the next filtered request."""
+    from sqlmodel import Session
+    from models import Attributes
+    from settings import engine
+
+    value = f"v{uuid4().hex[:8]}"
+    client.get("/products/?attr.Panel=IPS")
+    with Session(engine) as session:
+        attribute = Attributes(name="Panel", value=value, product_id=1)
+        session.add(attribute)
+        session.commit()
+        try:
+            data = client.get(f"/products/?attr.Panel={value}").json()
+            assert [item["id"] for item in data["items"]] == [1]
+        finally:
+            session.delete(attribute)
+            session.commit()
+
+    assert client.get(f"/products/?attr.Panel={value}").json()["items"] == []
+
+
+def test_get_products_price_range_and_sort():
+    """Price filters and sorting use the region/period price, with price cursors."""
+    base = "/products/?region=SG&period=6"
+    response = client.get(f"{base}&min_price=150&max_price=1000&page_size=50")
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    prices = [item["pricing"][0]["price"] for item in data["items"]]
+    assert prices and all(150 <= price <= 1000 for price in prices)
+    assert prices == sorted(prices)
+    assert data["total_items"] == len(prices)
+
+    descending = client.get(f"{base}&sort=price_desc&page_size=50").json()
+    prices = [item["pricing"][0]["price"] for item in descending["items"]]
+    assert prices == sorted(prices, reverse=True)
+
+    # Cursor pages continue the price order without gaps or repeats
+    walked = []
+    url = f"{base}&sort=price_asc&page_size=4"
+    while url:
+        page = client.get(url).json()
+        walked += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        url = f"{base}&sort=price_asc&page_size=4&after={cursor}" if cursor else None
+    ascending = client.get(f"{base}&sort=price_asc&page_size=100").json()
+    assert walked == [item["id"] for item in ascending["items"]]
+
+    # Combines with attribute filters
+    data = client.get(f"{base}&sort=price_asc&attr.Panel=IPS").json()
+    assert data["items"]
+    for item in data["items"]:
+        assert {"name": "Panel", "value": "IPS"} in item["attributes"]
+
+    response = client.get("/products/?region=SG&sort=price_asc")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_quote_prices_lines_from_pricing_matrix():
+    """Quotes use the product's region/period price; unpriced lines are listed."""
+    product = client.get("/products/1").json()
+    pricing = product["pricing"][0]
+    region, period = pricing["region_code"], pricing["rental_period_months"]
+    lines = [
+        {"product_id": 1, "region": region, "period": period, "quantity": 3},
+        {"product_id": 10**9, "region": region, "period": period},
+        {"product_id": 1, "region": "XX", "period": period},
+    ]
+    response = client.post("/quotes", json={"lines": lines})
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["lines"][0]["unit_price"] == pricing["price"]
+    assert data["lines"][0]["line_total"] == pricing["price"] * 3
+    assert data["lines"][1]["unit_price"] is None
+    assert data["unavailable"] == [1, 2]
+    assert data["total"] == pricing["price"] * 3
+
+    # Once the matrix is built, quotes take no connection at all
+    from settings import pool_stats
+
+    acquisitions = pool_stats.acquisitions
+    assert client.post("/quotes", json={"lines": lines}).json() == data
+    assert pool_stats.acquisitions == acquisitions
+
+    for line in (
+        {**lines[0], "quantity": 0},
+        {**lines[0], "quantity": 10**16},
+        {**lines[0], "product_id": 10**20},
+    ):
+        response = client.post("/quotes", json={"lines": [line]})
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+
+
+def test_quote_follows_price_changes():
+    """A committed price change is used by the next quote."""
+    from sqlmodel import Session, select
+    from models import ProductPricings, Regions, RentalPeriods
+    from settings import engine
+
+    with Session(engine) as session:
+        pricing = session.exec(select(ProductPricings)).first()
+        region = session.get(Regions, pricing.region_id)
+        period = session.get(RentalPeriods, pricing.rental_period_id)
+        line = {
+            "product_id": pricing.product_id,
+            "region": region.code,
+            "period": period.month,
+            "quantity": 2,
+        }
+        original = pricing.price
+        assert client.post("/quotes", json={"lines": [line]}).json()["total"] == (
+            original * 2
+        )
+
+        pricing.price = original + 7
+        session.add(pricing)
+        session.commit()
+        try:
+            data = client.post("/quotes", json={"lines": [line]}).json()
+            assert data["total"] == (original + 7) * 2
+        finally:
+            pricing.price = original
+            session.add(pricing)
+            session.commit()
+
+
+def test_reads_use_replicas_until_the_client_writes(tmp_path, monkeypatch):
+    """Reads go to a replica (a second SQLite file), then the primary after a write."""
+    import json
+    import shutil
+    import sqlite3
+    from replicas import create_replica_engines, replica_router
+    from response_cache import response_cache
+    from settings import engine
+
+    replica_path = tmp_path / "replica.db"
+    shutil.copy(engine.url.database, replica_path)
+    # A product only the replica has, so responses show which database answered
+    with sqlite3.connect(replica_path) as db:
+        product_id = db.execute(
+            "INSERT INTO products (name, created_at, updated_at) "
+            "VALUES ('Replica only', '2024-01-01', '2024-01-01')"
+        ).lastrowid
+        db.execute(
+            "INSERT INTO productdocuments (product_id, body, updated_at) "
+            "VALUES (?, ?, '2024-01-01')",
+            (product_id, b'{"id":%d,"name":"Replica only"}' % product_id),
+        )
+    down, replica = create_replica_engines(
+        f"sqlite:///{tmp_path}/missing/replica.db, sqlite:///{replica_path}"
+    )
+    monkeypatch.setattr(replica_router, "engines", [down, replica])
+    monkeypatch.setattr(replica_router, "down_until", {})
+
+    def read():
+        response_cache.invalidate()
+        return client.get(f"/products/{product_id}").status_code
+
+    try:
+        # The unreachable replica is skipped, then left out until its retry time
+        assert read() == status.HTTP_200_OK
+        assert id(down) in replica_router.down_until
+        assert read() == status.HTTP_200_OK
+
+        # A document missing on both sides is stored from the primary's rows,
+        # never from the replica's stale copy
+        with sqlite3.connect(engine.url.database) as db:
+            stored_id, name = db.execute(
+                "SELECT id, name FROM products ORDER BY id LIMIT 1"
+            ).fetchone()
+            db.execute("DELETE FROM productdocuments WHERE product_id = ?", (stored_id,))
+        with sqlite3.connect(replica_path) as db:
+            db.execute("UPDATE products SET name = 'Stale' WHERE id = ?", (stored_id,))
+            db.execute("DELETE FROM productdocuments WHERE product_id = ?", (stored_id,))
+        response_cache.invalidate()
+        assert client.get(f"/products/{stored_id}").json()["name"] == name
+        with sqlite3.connect(engine.url.database) as db:
+            (body,) = db.execute(
+                "SELECT body FROM productdocuments WHERE product_id = ?", (stored_id,)
+            ).fetchone()
+        assert json.loads(body)["name"] == name
+
+        # Cache the replica's response
+        assert read() == status.HTTP_200_OK
+        assert len(response_cache) == 1
+
+        username = f"user-{uuid4().hex[:8]}"
+        response = client.post(
+            "/register/",
+            json={
+                "username": username,
+                "password": "secret",
+                "email": f"{username}@example.com",
+            },
+        )
+        assert "read_primary_until" in response.headers["set-cookie"]
+        # Pinned to the primary, which does not have the replica's product,
+        # and not answered from the response cached off the replica either
+        assert client.get(f"/products/{product_id}").status_code == 404
+        assert read() == status.HTTP_404_NOT_FOUND
+        client.cookies.clear()
+        assert read() == status.HTTP_200_OK
+    finally:
+        client.cookies.clear()
+        response_cache.invalidate()
+
+
+def test_products_served_from_catalog_snapshot(tmp_path, monkeypatch):
+    """Published snapshots answer /products/ like the database, and are swapped in."""
+    import asyncio
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlmodel import Session
+    from sqlmodel.ext.asyncio.session import AsyncSession
+    from catalog_snapshot import build_snapshot, catalog_snapshot
+    from dimensions import dimension_cache
+    from models import Attributes
+    from response_cache import response_cache
+    from settings import engine, pool_stats, sql_url, to_async_url
+
+    def publish():
+        async def build():
+            # A separate engine; the app's pool belongs to the test client's loop
+            build_engine = create_async_engine(to_async_url(sql_url))
+            async with AsyncSession(build_engine) as session:
+                await build_snapshot(session, dimension_cache, tmp_path)
+            await build_engine.dispose()
+
+        asyncio.run(build())
+
+    def get(url):
+        response_cache.invalidate()
+        return client.get(url).json()
+
+    urls = [
+        "/products/?page_size=5",
+        "/products/?page=2&page_size=4&region=SG&period=6",
+        "/products/?region=MY&page_size=3&with_total=false",
+        "/products/?region=XX",
+        "/products/?page_size=3&region=SG&fields=name&include=pricing",
+        "/products/1",
+        "/products/1?fields=sku&include=",
+    ]
+    expected = {url: get(url) for url in urls}
+    publish()
+    monkeypatch.setattr(catalog_snapshot, "directory", tmp_path)
+    monkeypatch.setattr(catalog_snapshot, "check_seconds", 0)
+    try:
+        for url in urls:
+            assert get(url) == expected[url]
+            response_cache.invalidate()
+            acquisitions = pool_stats.acquisitions
+            response = client.get(url)
+            assert 'desc="0 queries"' in response.headers["server-timing"]
+            # No connection is even checked out
+            assert pool_stats.acquisitions == acquisitions, url
+        first = get("/products/?page_size=3")
+        after = get(f"/products/?page_size=3&after={first['next_cursor']}")
+        assert after["items"][0]["id"] > first["items"][-1]["id"]
+        version = catalog_snapshot.snapshot.version
+
+        # Local changes are read from the database until a new snapshot is out
+        with Session(engine) as session:
+            attribute = Attributes(name="Snapshot", value="fresh", product_id=1)
+            session.add(attribute)
+            session.commit()
+            try:
+                new_attribute = {"name": "Snapshot", "value": "fresh"}
+                assert new_attribute in get("/products/1")["attributes"]
+                assert new_attribute in get("/products/?page_size=1")["items"][0][
+                    "attributes"
+                ]
+                publish()
+                assert new_attribute in get("/products/1")["attributes"]
+                assert catalog_snapshot.snapshot.version > version
+                assert catalog_snapshot.changed == {}
+            finally:
+                session.delete(attribute)
+                session.commit()
+    finally:
+        catalog_snapshot.snapshot = None
+        catalog_snapshot._pointer_state = None
+        response_cache.invalidate()
+
+
+def test_sparse_fieldsets_trim_queries_and_items():
+    """fields/include trim the items and skip the relation queries."""
+    from response_cache import response_cache
+
+    def get(url):
+        response_cache.invalidate()
+        response = client.get(url)
+        queries = int(response.headers["server-timing"].split('desc="')[1].split()[0])
+        return response, queries
+
+    get("/products/?page_size=5&region=SG&period=6")
+    full, full_queries = get("/products/?page_size=5&region=SG&period=6")
+    response, queries = get(
+        "/products/?page_size=5&region=SG&period=6&fields=name&include=pricing"
+    )
+    assert response.status_code == status.HTTP_200_OK
+    items = response.json()["items"]
+    assert items == [
+        {"id": item["id"], "name": item["name"], "pricing": item["pricing"]}
+        for item in full.json()["items"]
+    ]
+    assert queries == full_queries - 1
+
+    response, queries = get("/products/?page_size=5&fields=id&include=")
+    assert [set(item) for item in response.json()["items"]] == [{"id"}] * 5
+    assert queries == full_queries - 2
+
+    response, _ = get("/products/1?fields=sku&include=attributes")
+    assert set(response.json()) == {"id", "sku", "attributes"}
+
+    response, _ = get("/products/?include=prices")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert client.get("/products/1?fields=price").status_code == 400
+
+    # The schema only requires what every sparse response carries
+    schemas = client.get("/openapi.json").json()["components"]["schemas"]
+    assert schemas["SparseProductResponse"]["required"] == ["id"]
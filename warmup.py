@@ -0,0 +1,92 @@
+"""Startup warm-up and readiness.
+
+The app accepts traffic as soon as it starts; `warm_up` then opens the pool's
+connections, loads the in-memory caches and builds the search and facet
+indexes and the pricing matrix in the background, and `/ready` reports 503
+until it has finished, so load balancers only route to warm workers.
+"""
+import asyncio
+from contextlib import AsyncExitStack
+from time import perf_counter
+from typing import Optional
+
+from loguru import logger
+from sqlalchemy import text
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from dimensions import dimension_cache
+from facet_index import facet_index
+from pricing_matrix import pricing_matrix
+from search_index import search_index
+from settings import async_engine, engine, settings
+
+
+class Readiness:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.ready = False
+        self.error: Optional[str] = None
+        self.warmup_ms: Optional[float] = None
+
+    def snapshot(self) -> dict:
+        return {
+            "status": "ready" if self.ready else "warming_up",
+            "error": self.error,
+            "warmup_ms": self.warmup_ms,
+        }
+
+
+readiness = Readiness()
+
+
+def seed_sample_data():
+    """Seed the sample catalog into an empty database (dev only)."""
+    # Imported here so production workers never load the seeding code
+    from sqlmodel import Session
+
+    from create_data import create_test_data
+
+    with Session(engine) as session:
+        create_test_data(session=session)
+
+
+async def warm_pool(connections: int) -> int:
+    """Open up to `connections` pooled connections at once, then return them."""
+    pool_size = getattr(async_engine.pool, "size", None)
+    # Pools that cannot be sized (in-memory SQLite) hold a single connection
+    connections = min(connections, pool_size()) if callable(pool_size) else 1
+    async with AsyncExitStack() as stack:
+        for _ in range(connections):
+            conn = await stack.enter_async_context(async_engine.connect())
+            await conn.execute(text("SELECT 1"))
+    return connections
+
+
+async def warm_up(retry_seconds: float = 5):
+    """Seed (if enabled), warm the pool and load caches; retry until it works."""
+    readiness.reset()
+    started = perf_counter()
+    while True:
+        try:
+            if settings.SEED_ON_STARTUP:
+                await asyncio.to_thread(seed_sample_data)
+            opened = await warm_pool(settings.DB_POOL_SIZE)
+            async with AsyncSession(async_engine) as session:
+                await dimension_cache.refresh(session)
+                await search_index.ensure_current(session)
+                await facet_index.ensure_current(session)
+                await pricing_matrix.ensure_current(session)
+            break
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            readiness.error = str(e)
+            logger.error(f"Warm-up failed, retrying in {retry_seconds}s: {e}")
+            await asyncio.sleep(retry_seconds)
+
+    readiness.warmup_ms = round((perf_counter() - started) * 1000, 3)
+    readiness.error = None
+    readiness.ready = True
+    logger.info(f"Warmed {opened} connections and caches in {readiness.warmup_ms} ms")